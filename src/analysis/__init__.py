@@ -1,2 +1,6 @@
 from .base_pathway_model import BasePathwayModel
-from .base_fva import BaseFVA
\ No newline at end of file
+from .base_fva import BaseFVA
+from .presolve import Presolve
+from .lp_backend import create_backend
+from .stoichiometry import StoichiometricView
+from .knockout_screen import KnockoutScreen
@@ -1,9 +1,18 @@
+import os
+import time
+import uuid
+import hashlib
 import logging
 
-from cameo import fba, flux_variability_analysis
+import pandas as pd
+from cameo import fba
+from cameo.flux_analysis.analysis import FluxVariabilityResult
 from cobra.core import DictList
 
 from .base_pathway_model import BasePathwayModel
+from .lp_backend import create_backend
+
+logger = logging.getLogger('timeout_errors')
 
 
 class BaseFVA(BasePathwayModel):
@@ -11,8 +20,30 @@ class BaseFVA(BasePathwayModel):
                 measured_metabolites,
                 filter_by_subsystem=False,
                 add_constraints=False,
-                without_transports=True):
-
+                without_transports=True,
+                progress=None,
+                budget=None,
+                reaction_budget=10 * 60,
+                dump_dir=None,
+                presolve=None,
+                prune=False,
+                max_distance=None,
+                backend='optlang'):
+        '''
+        FVA of reactions while objective of measured metabolites is optimal.
+        progress is called with number of solved and total LPs.
+        FVA stops after budget seconds and each LP after reaction_budget
+        seconds, reactions which are not solved are left out of results
+        and listed in solver_report of results.
+        LP of problems which fail or are not solved is written into dump_dir.
+        presolve skips LPs of blocked and coupled reactions.
+        prune replaces ranges of reactions which are not connected to
+        producers of measured metabolites within max_distance reactions
+        by their baseline ranges in presolve. Baseline ranges are solved
+        without objective, so they are outer bounds of exact ranges
+        rather than exact ones.
+        backend is name of LP backend which solves min and max of reactions.
+        '''
         if add_constraints:
             self.increasing_metabolite_constraints(measured_metabolites)
 
@@ -23,24 +54,130 @@ class BaseFVA(BasePathwayModel):
         if filter_by_subsystem:
             reactions = self.filter_reaction_by_subsystems()
 
-        self.solver.configuration.timeout = 10 * 60
+        self.solver.configuration.timeout = reaction_budget
+
+        affected = None
+        if prune:
+            if presolve is None:
+                raise ValueError('prune requires presolve of model')
+            if max_distance is None:
+                raise ValueError('prune requires max_distance')
+            affected = presolve.affected_reactions([
+                r.id
+                for k in measured_metabolites
+                for r in self.metabolites.get_by_id(k).producers(
+                    without_transports)
+            ], max_distance)
 
         try:
-            results = flux_variability_analysis(
-                self, reactions=reactions, fraction_of_optimum=1)
-        except:
-            logging.getLogger('timeout_errors').error('FVA timeout error')
-            logging.getLogger('timeout_errors').error(self.solver.to_json())
+            results = self.flux_variability(
+                reactions, fraction_of_optimum=1, progress=progress,
+                budget=budget, presolve=presolve, affected=affected,
+                backend=backend, timeout=reaction_budget)
+        except Exception as e:
+            logger.error('FVA failed with %s: %s' %
+                         (e, self._describe_problem(dump_dir)))
             raise TimeoutError('FVA timeout error')
 
+        report = results.solver_report
+        # pruned ranges are approximate, so it is recorded with results
+        report['max_distance'] = max_distance if prune else None
+        if report['unsolved']:
+            logger.warning('FVA left %d reactions unsolved in %.1fs: %s' %
+                           (len(report['unsolved']), report['elapsed'],
+                            self._describe_problem(dump_dir)))
+        return results
+
+    def flux_variability(self, reactions=None, fraction_of_optimum=1,
+                         progress=None, budget=None, presolve=None,
+                         affected=None, backend='optlang', timeout=None):
+        '''
+        Minimizes and maximizes flux of each reaction while objective is
+        fixed to fraction of its optimum, as flux_variability_analysis
+        of cameo but reports progress after each LP.
+        Reaction whose min or max is infeasible gets other bound for both.
+        Reactions whose LP fails or hits time limit of timeout seconds or
+        remaining budget, and ones which are not reached in budget seconds
+        are listed as unsolved in solver_report.
+        If presolve is given, only representatives of reactions
+        which are not blocked are solved. If affected reactions are given,
+        other reactions get their baseline ranges in presolve.
+        LPs are solved by backend in lp_backend.backends.
+        '''
+        reactions = self.reactions if reactions is None else reactions
+        solving = reactions
+        if affected is not None:
+            if presolve is None:
+                raise ValueError('pruning requires baseline of presolve')
+            solving = [r for r in reactions if r.id in affected]
+        targets = solving
+        if presolve is not None:
+            targets = presolve.representatives(solving, self)
+        started = time.time()
+        (bounds, infeasible, unsolved, solved) = create_backend(
+            backend).variability(self, targets, fraction_of_optimum,
+                                 progress, budget, timeout)
+
+        ranges = dict()
+        for r in targets:
+            if r.id in unsolved or not all(
+                    r.id in bounds[d] or r.id in infeasible[d]
+                    for d in bounds):
+                continue
+            lower = bounds['min'].get(r.id, bounds['max'].get(r.id, 0))
+            upper = bounds['max'].get(r.id, lower)
+            ranges[r.id] = (lower, upper)
+
+        if presolve is not None:
+            (ranges, _) = presolve.expand([r.id for r in solving], ranges)
+        pruned = 0
+        if affected is not None:
+            for r in reactions:
+                if r.id not in affected and r.id not in ranges and \
+                        r.id in presolve.baseline:
+                    ranges[r.id] = presolve.baseline[r.id]
+                    pruned += 1
+        unsolved = set(r.id for r in reactions if r.id not in ranges)
+
+        ids = [r.id for r in reactions if r.id in ranges]
+        results = FluxVariabilityResult(pd.DataFrame(
+            [ranges[i] for i in ids], index=ids,
+            columns=['lower_bound', 'upper_bound']))
+        results.solver_report = {
+            'solved': len(ids),
+            'unsolved': sorted(unsolved),
+            'lps': solved,
+            'skipped_lps': 2 * (len(reactions) - len(targets)),
+            'pruned': pruned,
+            'elapsed': round(time.time() - started, 3),
+            'budget': budget
+        }
         return results
 
+    def _describe_problem(self, dump_dir=None):
+        '''
+        Compact fingerprint of LP problem which is also written
+        in LP format into dump_dir if it is given
+        '''
+        fingerprint = hashlib.sha1(str(
+            self.solver.objective.expression).encode('utf-8')).hexdigest()
+        description = '%d variables, %d constraints, objective %s' % (
+            len(self.solver.variables), len(self.solver.constraints),
+            fingerprint[:12])
+        if dump_dir:
+            path = os.path.join(dump_dir, '%s-%s.lp' %
+                                (fingerprint[:12], uuid.uuid4().hex[:8]))
+            with open(path, 'w') as f:
+                f.write(str(self.solver))
+            description += ', dumped into %s' % path
+        return description
+
     def fba(self,
             measured_metabolites,
             filter_by_subsystem=False,
             add_constraints=False):
         if add_constraints:
-            self.increasing_metabolite_constrains(measured_metabolites)
+            self.increasing_metabolite_constraints(measured_metabolites)
 
         if measured_metabolites is not None:
             self.set_objective_coefficients(measured_metabolites)
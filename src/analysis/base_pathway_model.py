@@ -1,12 +1,17 @@
 import logging
-from collections import defaultdict
+from functools import partial
+from contextlib import contextmanager
+from collections import defaultdict, OrderedDict
 from typing import List
 
+import numpy as np
 from sympy.core.singleton import S
 from cameo.core import SolverBasedModel, Metabolite, Reaction
 from cameo.core.pathway import Pathway
+from cameo.util import TimeMachine
 
 from services import DataReader
+from .stoichiometry import StoichiometricView
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +40,92 @@ class BasePathwayModel(SolverBasedModel):
         '''
         return Pathway([r for r in self.reactions if r.subsystem == name])
 
+    def stoichiometric_view(self):
+        '''
+        Sparse stoichiometric view of model which is cached
+        until reactions or metabolites of model change
+        '''
+        view = getattr(self, '_stoichiometric_view', None)
+        if view is None or not view.is_current(self):
+            view = StoichiometricView.from_model(self)
+            self._stoichiometric_view = view
+        return view
+
+    @contextmanager
+    def rollback(self):
+        '''
+        What-if scenario on solver of model. Constraints and bounds changed
+        by methods of model in block are rolled back after it, so solver is
+        reused and keeps its basis instead of copying model.
+        Scenarios can be nested.
+        '''
+        time_machines = self.__dict__.setdefault('_time_machines', [])
+        with TimeMachine() as tm:
+            time_machines.append(tm)
+            try:
+                yield tm
+            finally:
+                time_machines.pop()
+
+    def _time_machine(self):
+        time_machines = getattr(self, '_time_machines', None)
+        return time_machines[-1] if time_machines else None
+
+    def knock_out_reactions(self, reaction_ids):
+        '''
+        Sets bounds of reactions to zero
+        '''
+        time_machine = self._time_machine()
+        for i in reaction_ids:
+            self.reactions.get_by_id(i).change_bounds(
+                lb=0, ub=0, time_machine=time_machine)
+
+    def _pathway_indices(self, pathway):
+        view = self.stoichiometric_view()
+        if type(pathway) == str:
+            return view.subsystem_reactions(pathway)
+        return view.reaction_indices(r.id for r in pathway.reactions)
+
+    def add_flux_constraints(self, columns, forward=1., reverse=0.,
+                             lb=None, ub=None):
+        '''
+        Adds one constraint per array of reaction indices in columns
+        which bounds weighted sum of forward and reverse variables of
+        reactions. Weights are scalars or arrays aligned with indices.
+        Constraints are added in batch and their coefficients are set
+        without building symbolic sums. They are removed when rollback
+        block they are added in ends.
+        '''
+        columns = [np.asarray(c, dtype=int) for c in columns]
+        forward = np.broadcast_to(forward, (len(columns), )) \
+            if np.isscalar(forward) else forward
+        reverse = np.broadcast_to(reverse, (len(columns), )) \
+            if np.isscalar(reverse) else reverse
+
+        constraints = [
+            self.solver.interface.Constraint(S.Zero, lb=lb, ub=ub)
+            for _ in columns
+        ]
+        time_machine = self._time_machine()
+        if time_machine is None:
+            self.solver.add(constraints)
+        else:
+            time_machine(do=partial(self.solver.add, constraints),
+                         undo=partial(self.solver.remove, constraints))
+        for constraint, indices, f, r in zip(constraints, columns,
+                                             forward, reverse):
+            (f, r) = (np.broadcast_to(f, indices.shape),
+                      np.broadcast_to(r, indices.shape))
+            coefficients = dict()
+            for j, f_j, r_j in zip(indices, f, r):
+                reaction = self.reactions[int(j)]
+                if f_j:
+                    coefficients[reaction.forward_variable] = float(f_j)
+                if r_j:
+                    coefficients[reaction.reverse_variable] = float(r_j)
+            constraint.set_linear_coefficients(coefficients)
+        return constraints
+
     def activate_pathway(self, pathway):
         '''
         Active subsystem means that
@@ -43,32 +134,44 @@ class BasePathwayModel(SolverBasedModel):
         r_x \in S
         \sum_{i=1}^{n} V_{r_i} > 0
         '''
-        p = self.get_pathway(pathway) if type(pathway) == str else pathway
-        sum_flux = sum(r.forward_variable for r in p.reactions)
-        self.solver.add(self.solver.interface.Constraint(sum_flux, lb=1e-5))
+        self.activate_pathways([pathway])
 
     def activate_pathways(self, pathway_names: List[str]):
         '''
         Active all subsystems in names
         '''
-        for n in set(pathway_names):
-            self.activate_pathway(n)
+        pathways = list(OrderedDict.fromkeys(pathway_names))
+        self.add_flux_constraints(
+            [self._pathway_indices(p) for p in pathways], lb=1e-5)
 
     def make_pathway_inactive(self, pathway):
         '''
         Knock outing subsystems means knock outing all reactions of subsystems
         '''
-        p = self.get_pathway(pathway) if type(pathway) == str else pathway
-        sum_flux = sum(r.forward_variable + r.reverse_variable
-                       for r in p.reactions)
-        self.solver.add(self.solver.interface.Constraint(sum_flux, lb=0, ub=0))
+        self.make_pathways_inactive([pathway])
 
     def make_pathways_inactive(self, pathway_names: List[str]):
         '''
         Knock outs all pathways in pathway_names list
         '''
-        for s in set(pathway_names):
-            self.make_pathway_inactive(s)
+        pathways = list(OrderedDict.fromkeys(pathway_names))
+        self.add_flux_constraints(
+            [self._pathway_indices(p) for p in pathways],
+            forward=1., reverse=1., lb=0, ub=0)
+
+    def increasing_metabolite_constraints(self, measured_metabolites,
+                                          threshold=1e-5):
+        '''
+        Constrains production of measured metabolites which are increased
+        to be at least threshold
+        '''
+        view = self.stoichiometric_view()
+        rows = [view.producing_coefficients(k)
+                for k, v in measured_metabolites.items() if v > 0]
+        return self.add_flux_constraints([c for c, _, _ in rows],
+                                         [f for _, f, _ in rows],
+                                         [r for _, _, r in rows],
+                                         lb=threshold)
 
     def set_objective_coefficients(self,
                                    measured_metabolites,
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, cpu_count
+from optlang.interface import OPTIMAL
+from cameo.exceptions import SolveError
+
+from .base_fva import BaseFVA
+
+
+class KnockoutScreen:
+    '''
+    Pathway scores of a measurement profile under knockout of each
+    subsystem or reaction. Score of a pathway is mean of differences of
+    min and max flux of its reactions from the profile without knockout,
+    as reaction and pathway scalers score samples against healthy flux.
+    Knockouts are evaluated in batches by worker processes, each on one
+    model whose knockouts are rolled back after each evaluation.
+    '''
+
+    methods = ['fba', 'fva']
+    levels = ['subsystem', 'reaction']
+
+    def __init__(self, model: BaseFVA, measured_metabolites, method='fba',
+                 level='subsystem', n_jobs=-1, early_infeasibility=True,
+                 without_transports=True, budget=None, backend='optlang'):
+        if method not in self.methods:
+            raise ValueError('method should be one of %s but not %s' %
+                             (self.methods, method))
+        if level not in self.levels:
+            raise ValueError('level should be one of %s but not %s' %
+                             (self.levels, level))
+        self.model = model.copy()
+        self.model.set_objective_coefficients(measured_metabolites,
+                                              without_transports)
+        self.method = method
+        self.level = level
+        self.n_jobs = cpu_count() if n_jobs < 0 else n_jobs
+        self.early_infeasibility = early_infeasibility
+        self.budget = budget
+        self.backend = backend
+
+    def screen(self, targets=None):
+        '''
+        Matrix of pathway scores where rows are knocked out subsystems or
+        reactions and columns are subsystems. Rows of knockouts which
+        make model infeasible are NaN.
+        '''
+        view = self.model.stoichiometric_view()
+        if targets is None:
+            targets = view.subsystems if self.level == 'subsystem' \
+                else view.reactions
+        targets = list(targets)
+
+        baseline = self._ranges(self.model)
+        if baseline is None:
+            raise ValueError('model is infeasible without knockouts')
+
+        if self.n_jobs > 1 and len(targets) > 1:
+            size = -(-len(targets) // self.n_jobs)
+            ranges = [
+                r for batch in Parallel(n_jobs=self.n_jobs)(
+                    delayed(self._screen_batch)(targets[i:i + size])
+                    for i in range(0, len(targets), size))
+                for r in batch
+            ]
+        else:
+            ranges = self._screen_batch(targets)
+
+        scores = np.full((len(targets), len(view.subsystems)), np.nan)
+        for i, r in enumerate(ranges):
+            if r is not None:
+                scores[i] = self._pathway_scores(view, r, baseline)
+        return pd.DataFrame(scores, index=targets, columns=view.subsystems)
+
+    def _screen_batch(self, targets):
+        '''
+        Ranges of reactions under knockout of each target
+        '''
+        ranges = list()
+        for target in targets:
+            with self.model.rollback():
+                if self.level == 'subsystem':
+                    self.model.make_pathway_inactive(target)
+                else:
+                    self.model.knock_out_reactions([target])
+                ranges.append(self._ranges(self.model))
+        return ranges
+
+    def _ranges(self, model):
+        '''
+        Min and max flux of reactions in order of model as array
+        or None if model is infeasible. Min and max of fba are its flux.
+        Reactions which are not solved by fva are NaN.
+        '''
+        if self.early_infeasibility and self.method == 'fva' and \
+                model.solver.optimize() != OPTIMAL:
+            return None
+        if self.method == 'fba':
+            try:
+                fluxes = model.fba(None).fluxes
+            except SolveError:
+                return None
+            flux = np.array([fluxes[r.id] for r in model.reactions])
+            return np.vstack([flux, flux])
+        try:
+            df = model.flux_variability(
+                fraction_of_optimum=1, budget=self.budget,
+                backend=self.backend).data_frame
+        except TimeoutError:
+            return None
+        df = df.reindex([r.id for r in model.reactions])
+        return np.vstack([df.lower_bound.values, df.upper_bound.values])
+
+    @staticmethod
+    def _pathway_scores(view, ranges, baseline):
+        diff = (ranges - baseline).sum(axis=0)
+        solved = ~np.isnan(diff)
+        counts = np.bincount(view.membership[solved],
+                             minlength=len(view.subsystems))
+        sums = np.bincount(view.membership[solved], weights=diff[solved],
+                           minlength=len(view.subsystems))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / counts
@@ -0,0 +1,147 @@
+import math
+import time
+from functools import partial
+
+import numpy as np
+from sympy.core.singleton import S
+from optlang.interface import OPTIMAL, UNBOUNDED, INFEASIBLE
+from cameo.util import TimeMachine
+
+
+class LPBackend:
+    '''
+    Solver of min and max flux of reactions of model
+    while objective of model is fixed to fraction of its optimum.
+    Statuses of LPs are reported with optlang status names.
+    '''
+
+    def variability(self, model, reactions, fraction_of_optimum=1,
+                    progress=None, budget=None, timeout=None):
+        '''
+        Returns min and max bounds of reactions, reactions whose min or max
+        is infeasible, reactions which are not solved and number of LPs.
+        Min and max of each reaction are solved one after other and
+        budget is checked between reactions, so solving which stops
+        after budget seconds leaves only complete ranges.
+        Each LP is limited to timeout seconds, which is current timeout of
+        solver by default, and remaining budget.
+        Reactions whose LP hits time limit or fails are not solved.
+        '''
+        if timeout is None:
+            timeout = self.get_timeout(model)
+        total = 2 * len(reactions)
+        bounds = {'min': dict(), 'max': dict()}
+        infeasible = {'min': set(), 'max': set()}
+        unsolved = set()
+        started = time.time()
+        solved = 0
+
+        with TimeMachine() as tm:
+            restore = partial(self.set_timeout, model, timeout)
+            tm(do=restore, undo=restore)
+            self.prepare(model, fraction_of_optimum, tm)
+            for r in reactions:
+                if budget is not None and time.time() - started >= budget:
+                    break
+                for direction in ['min', 'max']:
+                    limit = timeout
+                    if budget is not None:
+                        remaining = max(budget - (time.time() - started), 1)
+                        limit = remaining if limit is None \
+                            else min(limit, remaining)
+                    self.set_timeout(model, limit)
+                    (status, value) = self.solve(model, r, direction)
+                    if status == OPTIMAL:
+                        bounds[direction][r.id] = value
+                    elif status == UNBOUNDED:
+                        bounds[direction][r.id] = \
+                            -np.inf if direction == 'min' else np.inf
+                    elif status == INFEASIBLE:
+                        infeasible[direction].add(r.id)
+                    else:
+                        unsolved.add(r.id)
+                    solved += 1
+                    if progress:
+                        progress(solved, total)
+            if progress and solved < total:
+                progress(total, total)
+
+        return (bounds, infeasible, unsolved, solved)
+
+    def prepare(self, model, fraction_of_optimum, time_machine):
+        '''
+        Fixes objective of model to fraction of its optimum,
+        changes made on model should be undone by time_machine
+        '''
+        raise NotImplementedError()
+
+    def solve(self, model, reaction, direction):
+        '''
+        Returns status and optimum of min or max flux of reaction
+        '''
+        raise NotImplementedError()
+
+    def get_timeout(self, model):
+        '''
+        Seconds which LPs are limited to, None if they are not limited
+        '''
+        raise NotImplementedError()
+
+    def set_timeout(self, model, seconds):
+        '''
+        Limits following LPs to seconds, None removes the limit
+        '''
+        raise NotImplementedError()
+
+
+class OptlangBackend(LPBackend):
+    '''
+    Solves LPs by solver interface of model which is glpk by default
+    '''
+
+    def prepare(self, model, fraction_of_optimum, time_machine):
+        if fraction_of_optimum:
+            status = model.solver.optimize()
+            if status != OPTIMAL:
+                raise TimeoutError('Objective is %s' % status)
+            optimum = model.solver.objective.value * fraction_of_optimum
+            if model.solver.objective.direction == 'max':
+                (lb, ub) = (optimum, None)
+            else:
+                (lb, ub) = (None, optimum)
+            constraint = model.solver.interface.Constraint(
+                model.solver.objective.expression, lb=lb, ub=ub,
+                name='fixed_objective')
+            time_machine(do=partial(model.solver.add, constraint),
+                         undo=partial(model.solver.remove, constraint))
+        model.change_objective(S.Zero, time_machine=time_machine)
+
+    def solve(self, model, reaction, direction):
+        objective = model.solver.objective
+        objective.direction = direction
+        coefficients = {reaction.forward_variable: 1.,
+                        reaction.reverse_variable: -1.}
+        objective.set_linear_coefficients(coefficients)
+        status = model.solver.optimize()
+        value = objective.value if status == OPTIMAL else None
+        objective.set_linear_coefficients({v: 0. for v in coefficients})
+        return (status, value)
+
+    def get_timeout(self, model):
+        return model.solver.configuration.timeout
+
+    def set_timeout(self, model, seconds):
+        if seconds is not None:
+            seconds = int(math.ceil(seconds))
+        if model.solver.configuration.timeout != seconds:
+            model.solver.configuration.timeout = seconds
+
+
+backends = {'optlang': OptlangBackend}
+
+
+def create_backend(name='optlang'):
+    if name not in backends:
+        raise ValueError('backend should be one of %s but not %s' %
+                         (sorted(backends), name))
+    return backends[name]()
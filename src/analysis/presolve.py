@@ -0,0 +1,241 @@
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+from scipy.sparse import csgraph
+
+from models import MetabolicAdjMatrix
+
+from .base_fva import BaseFVA
+
+
+class Presolve:
+    '''
+    Reduction of FVA of a model which is computed once per model.
+    Blocked reactions have zero range under bounds of model and reactions
+    of linear chains are fully coupled by steady state of metabolites
+    which are only in two reactions, so only one representative of chain
+    is solved and ranges of others are scaled by their coupling ratio.
+    '''
+
+    revision = 3
+
+    def __init__(self, blocked=(), coupling=None, version=None, order=None,
+                 baseline=None, adjacency=None):
+        self.blocked = set(blocked)
+        # reaction id to (representative id, ratio) where v = ratio * v_rep
+        self.coupling = coupling or dict()
+        self.version = version
+        # rank of reactions to solve neighbouring reactions one after other
+        self.order = order or dict()
+        # ranges of reactions without objective and reaction graph
+        # of model which are used to prune reactions far from objective
+        self.baseline = baseline or dict()
+        self.adjacency = adjacency
+        self.revision = Presolve.revision
+
+    def __setstate__(self, state):
+        state.setdefault('order', dict())
+        state.setdefault('baseline', dict())
+        state.setdefault('adjacency', None)
+        state.setdefault('revision', 1)
+        self.__dict__.update(state)
+
+    def is_current(self, version):
+        return self.version == version and self.revision == Presolve.revision
+
+    @classmethod
+    def compute(cls, model: BaseFVA, tolerance=1e-9, version=None,
+                method='kernel'):
+        '''
+        Presolve of model where coupled reactions are found
+        by its stoichiometric kernel or by its linear chains
+        '''
+        ranges = model.flux_variability(fraction_of_optimum=0).data_frame
+        blocked = set(ranges[(ranges.lower_bound.abs() < tolerance) & (
+            ranges.upper_bound.abs() < tolerance)].index)
+        if method == 'kernel':
+            coupling = cls._kernel_coupling(model, blocked)
+        elif method == 'chains':
+            coupling = cls._linear_chains(model, blocked)
+        else:
+            raise ValueError('method should be either kernel or chains')
+        baseline = {
+            r.Index: (r.lower_bound, r.upper_bound)
+            for r in ranges.itertuples()
+        }
+        adjacency = MetabolicAdjMatrix(model).to_reaction_adj_matrix()
+        return cls(blocked, coupling, version, cls._neighbour_order(model),
+                   baseline, (adjacency.tocsr(),
+                              [r.id for r in model.reactions]))
+
+    @staticmethod
+    def _kernel_coupling(model, blocked, tolerance=1e-8):
+        '''
+        Fully coupled reactions whose rows in kernel of stoichiometric
+        matrix of balanced metabolites are proportional, since every
+        steady state flux is in that kernel.
+        '''
+        reactions = [r for r in model.reactions if r.id not in blocked]
+        view = model.stoichiometric_view()
+        metabolites = [
+            m for m in model.metabolites
+            if model.solver.constraints[m.id].lb == 0 and
+            model.solver.constraints[m.id].ub == 0
+        ]
+        if not len(metabolites):
+            return dict()
+        S = view.S[[view.metabolite_index[m.id] for m in metabolites]][
+            :, view.reaction_indices(r.id for r in reactions)]
+        S = S[np.flatnonzero(S.getnnz(axis=1))].toarray()
+        if not len(S):
+            return dict()
+
+        # economic svd only gives basis V of row space of S, kernel is
+        # not built since its projection I - V^T V is enough to compare rows
+        (_, singular_values, vt) = np.linalg.svd(S, full_matrices=False)
+        rank = int((singular_values > tolerance * max(
+            singular_values.max(), 1)).sum())
+        V = vt[:rank]
+        # squared norms of kernel rows are diagonal of projection
+        norms = 1 - (V**2).sum(axis=0)
+        # kernel rows of coupled reactions stay proportional when projected
+        # onto random directions, which groups candidates to be verified
+        G = np.random.RandomState(0).randn(len(reactions), 3)
+        projected = G - V.T.dot(V.dot(G))
+
+        coupling = dict()
+        groups = dict()
+        for j, r in enumerate(reactions):
+            if norms[j] < tolerance * 100:
+                continue
+            direction = projected[j] / np.linalg.norm(projected[j])
+            pivot = np.flatnonzero(np.abs(direction) > tolerance)[0]
+            sign = np.sign(direction[pivot])
+            key = np.round(direction * sign, 6).tobytes()
+            if key not in groups:
+                groups[key] = j
+                continue
+            k = groups[key]
+            # projection entry of reactions whose kernel rows are parallel
+            # is product of their kernel row norms
+            entry = -V[:, j].dot(V[:, k])
+            if abs(entry**2 - norms[j] * norms[k]) < tolerance * 100:
+                coupling[r.id] = (reactions[k].id, float(entry / norms[k]))
+        return coupling
+
+    @staticmethod
+    def _linear_chains(model, blocked):
+        parent = dict()
+
+        def find(reaction_id):
+            (root, ratio) = (reaction_id, 1.)
+            while root in parent:
+                (root, k) = parent[root]
+                ratio *= k
+            return (root, ratio)
+
+        for m in model.metabolites:
+            constraint = model.solver.constraints[m.id]
+            if constraint.lb != 0 or constraint.ub != 0:
+                continue
+            active = [r for r in m.reactions if r.id not in blocked]
+            if len(active) != 2:
+                continue
+            (a, b) = active
+            # S_a * v_a + S_b * v_b = 0
+            ratio = -a.metabolites[m] / b.metabolites[m]
+            ((root_a, k_a), (root_b, k_b)) = (find(a.id), find(b.id))
+            if root_a != root_b:
+                parent[root_b] = (root_a, ratio * k_a / k_b)
+
+        return {i: find(i) for i in parent}
+
+    @staticmethod
+    def _neighbour_order(model, max_degree=20):
+        '''
+        Breadth first order of reactions over metabolites which are not hubs
+        so that consecutive LPs are similar and start warm from last basis
+        '''
+        order = dict()
+        for start in model.reactions:
+            if start.id in order:
+                continue
+            queue = deque([start])
+            order[start.id] = len(order)
+            while queue:
+                r = queue.popleft()
+                for m in r.metabolites:
+                    if len(m.reactions) > max_degree:
+                        continue
+                    for neighbour in m.reactions:
+                        if neighbour.id not in order:
+                            order[neighbour.id] = len(order)
+                            queue.append(neighbour)
+        return order
+
+    def affected_reactions(self, reaction_ids, max_distance=None):
+        '''
+        Reactions connected to reactions over metabolites which are not
+        currency within max_distance reactions. Ranges of other reactions
+        are assumed to be their baseline ranges.
+        '''
+        if self.adjacency is None:
+            raise ValueError('presolve does not have reaction graph')
+        (adjacency, ids) = self.adjacency
+        indexes = {i: j for j, i in enumerate(ids)}
+        sources = [indexes[i] for i in set(reaction_ids) if i in indexes]
+        if not sources:
+            return set()
+        distances = csgraph.shortest_path(
+            adjacency, directed=False, unweighted=True,
+            indices=sources).min(axis=0)
+        limit = np.inf if max_distance is None else max_distance
+        return set(ids[j] for j in np.flatnonzero(
+            np.isfinite(distances) & (distances <= limit)))
+
+    def representatives(self, reactions, model):
+        '''
+        Reactions which need to be solved to infer ranges of reactions
+        in order of neighbourhood
+        '''
+        ids = set()
+        for r in reactions:
+            if r.id in self.blocked:
+                continue
+            (representative, _) = self.coupling.get(r.id, (r.id, 1.))
+            ids.add(representative)
+        ids = sorted(ids, key=lambda i: self.order.get(i, len(self.order)))
+        return [model.reactions.get_by_id(i) for i in ids]
+
+    def expand(self, reaction_ids, ranges):
+        '''
+        Ranges of reactions from ranges of their representatives.
+        Returns ranges and reactions whose representative is not solved.
+        '''
+        expanded = dict()
+        unsolved = set()
+        for i in reaction_ids:
+            if i in self.blocked:
+                expanded[i] = (0., 0.)
+                continue
+            (representative, ratio) = self.coupling.get(i, (i, 1.))
+            if representative not in ranges:
+                unsolved.add(i)
+                continue
+            (lower, upper) = ranges[representative]
+            expanded[i] = tuple(sorted((ratio * lower, ratio * upper)))
+        return (expanded, unsolved)
+
+    def save(self, path):
+        '''Writes presolve atomically into path'''
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
@@ -0,0 +1,82 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+
+
+class StoichiometricView:
+    '''
+    Sparse matrix view of a model where rows of S are metabolites and
+    columns are reactions in order of model. Subsystem membership vector
+    holds index of subsystem of each reaction in subsystems. Bounds change
+    with knockouts, so they are read from model by bounds.
+    '''
+
+    def __init__(self, S, reactions, metabolites, subsystems, membership):
+        self.S = S
+        self.reactions = reactions
+        self.metabolites = metabolites
+        self.subsystems = subsystems
+        self.membership = membership
+        self.reaction_index = {r: j for j, r in enumerate(reactions)}
+        self.metabolite_index = {m: i for i, m in enumerate(metabolites)}
+        self.subsystem_index = {s: k for k, s in enumerate(subsystems)}
+
+    @classmethod
+    def from_model(cls, model):
+        reactions = [r.id for r in model.reactions]
+        metabolites = [m.id for m in model.metabolites]
+        metabolite_index = {m: i for i, m in enumerate(metabolites)}
+        (data, rows, columns) = (list(), list(), list())
+        for j, r in enumerate(model.reactions):
+            for m, coefficient in r.metabolites.items():
+                data.append(coefficient)
+                rows.append(metabolite_index[m.id])
+                columns.append(j)
+        S = coo_matrix((data, (rows, columns)), dtype=float,
+                       shape=(len(metabolites), len(reactions))).tocsr()
+
+        subsystems = sorted(set(r.subsystem for r in model.reactions))
+        subsystem_index = {s: k for k, s in enumerate(subsystems)}
+        membership = np.array(
+            [subsystem_index[r.subsystem] for r in model.reactions],
+            dtype=int)
+        return cls(S, reactions, metabolites, subsystems, membership)
+
+    def is_current(self, model):
+        '''
+        Whether reactions, their subsystems and metabolites of model
+        are still the ones of view
+        '''
+        return self.reactions == [r.id for r in model.reactions] and \
+            self.metabolites == [m.id for m in model.metabolites] and \
+            all(self.subsystems[k] == r.subsystem
+                for k, r in zip(self.membership, model.reactions))
+
+    @staticmethod
+    def bounds(model):
+        '''
+        Current lower and upper bounds of reactions in order of view
+        '''
+        return (np.array([r.lower_bound for r in model.reactions]),
+                np.array([r.upper_bound for r in model.reactions]))
+
+    def subsystem_reactions(self, subsystem):
+        '''
+        Column indices of reactions of subsystem
+        '''
+        if subsystem not in self.subsystem_index:
+            return np.array([], dtype=int)
+        return np.flatnonzero(
+            self.membership == self.subsystem_index[subsystem])
+
+    def reaction_indices(self, reaction_ids):
+        return np.array([self.reaction_index[i] for i in reaction_ids],
+                        dtype=int)
+
+    def producing_coefficients(self, metabolite):
+        '''
+        Column indices of reactions of metabolite with coefficients of their
+        forward and reverse variables in production of metabolite
+        '''
+        row = self.S.getrow(self.metabolite_index[metabolite])
+        return (row.indices, np.maximum(row.data, 0),
+                np.maximum(-row.data, 0))
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 import cobra as cb
 import cobra.test
@@ -6,6 +7,10 @@ from sklearn.feature_extraction import DictVectorizer
 
 from .base_pathway_model import BasePathwayModel
 from .base_fva import BaseFVA
+from .presolve import Presolve
+from . import lp_backend
+from .lp_backend import create_backend, OptlangBackend
+from .knockout_screen import KnockoutScreen
 from models import *
 from services import DataReader, NamingService
 from preprocessing import MetabolicStandardScaler
@@ -40,6 +45,46 @@ class TestBasePathwayModel(unittest.TestCase):
         sum_flux = sum(solution.x_dict[r.id] for r in self.oxi_phos.reactions)
         self.assertEqual(sum_flux, 0)
 
+    def test_stoichiometric_view(self):
+        view = self.model.stoichiometric_view()
+        self.assertIs(view, self.model.stoichiometric_view())
+        i = view.metabolite_index['h2o2_p']
+        for r in self.h2o2_p.reactions:
+            self.assertEqual(view.S[i, view.reaction_index[r.id]],
+                             r.metabolites[self.h2o2_p])
+        self.assertEqual(
+            set(view.reaction_indices(r.id for r in self.oxi_phos.reactions)),
+            set(view.subsystem_reactions('Oxidative Phosphorylation')))
+
+    def test_stoichiometric_view_refresh(self):
+        view = self.model.stoichiometric_view()
+        self.model.remove_reactions([self.model.reactions[0]])
+        self.model.add_reaction(Reaction('new_reaction'))
+        refreshed = self.model.stoichiometric_view()
+        self.assertIsNot(view, refreshed)
+        self.assertIn('new_reaction', refreshed.reaction_index)
+
+    def test_increasing_metabolite_constraints(self):
+        self.model.increasing_metabolite_constraints({'h2o2_p': 1})
+        solution = self.model.solve()
+        production = sum(
+            max(solution.x_dict[r.id] * r.metabolites[self.h2o2_p], 0)
+            for r in self.h2o2_p.reactions)
+        self.assertTrue(production >= 1e-5 - 1e-9)
+
+    def test_rollback(self):
+        num_constraints = len(self.model.solver.constraints)
+        r = self.oxi_phos.reactions[0]
+        bounds = (r.lower_bound, r.upper_bound)
+        with self.model.rollback():
+            self.model.make_pathway_inactive(self.oxi_phos)
+            self.model.knock_out_reactions([r.id])
+            self.assertEqual(len(self.model.solver.constraints),
+                             num_constraints + 1)
+            self.assertEqual((r.lower_bound, r.upper_bound), (0, 0))
+        self.assertEqual(len(self.model.solver.constraints), num_constraints)
+        self.assertEqual((r.lower_bound, r.upper_bound), bounds)
+
     def test_set_objective_coefficients(self):
         self.model.set_objective_coefficients(
             {
@@ -71,8 +116,167 @@ class TestBaseFVA(unittest.TestCase):
         self.assertIsNotNone(df.loc['EX_fum_e'].upper_bound)
         self.assertIsNotNone(df.loc['EX_fum_e'].lower_bound)
 
+    def test_analyze_progress(self):
+        progress = list()
+        df = self.analyzer.analyze(
+            {'fru_e': 1.1}, progress=lambda *args: progress.append(args)
+        ).data_frame
+        total = 2 * len(self.analyzer.reactions)
+        self.assertEqual(progress[-1], (total, total))
+        self.assertEqual(len(progress), total)
+        self.assertTrue((df.lower_bound <= df.upper_bound + 1e-6).all())
+
+    def test_analyze_budget(self):
+        results = self.analyzer.analyze({'fru_e': 1.1}, budget=0)
+        report = results.solver_report
+        self.assertEqual(report['solved'], 0)
+        self.assertEqual(
+            len(report['unsolved']), len(self.analyzer.reactions))
+        self.assertTrue(results.data_frame.empty)
+
+    def test_analyze_partial_budget(self):
+        report = self.analyzer.analyze({'fru_e': 1.1},
+                                       budget=0.05).solver_report
+        self.assertEqual(report['lps'], 2 * report['solved'])
+
+    def test_analyze_failed_lp(self):
+        failing = self.analyzer.reactions[0].id
+
+        class FailingBackend(OptlangBackend):
+            def solve(self, model, reaction, direction):
+                if reaction.id == failing:
+                    return ('undefined', None)
+                return super().solve(model, reaction, direction)
+
+        with mock.patch.dict(lp_backend.backends, failing=FailingBackend):
+            results = self.analyzer.analyze({'fru_e': 1.1},
+                                            backend='failing')
+        self.assertIn(failing, results.solver_report['unsolved'])
+        self.assertNotIn(failing, results.data_frame.index)
+        self.assertEqual(len(results.data_frame),
+                         len(self.analyzer.reactions) - 1)
+
+    def test_analyze_lp_timeout(self):
+        timeouts = list()
+
+        class RecordingBackend(OptlangBackend):
+            def set_timeout(self, model, seconds):
+                timeouts.append(seconds)
+                super().set_timeout(model, seconds)
+
+        with mock.patch.dict(lp_backend.backends, recording=RecordingBackend):
+            self.analyzer.analyze({'fru_e': 1.1}, budget=60,
+                                  reaction_budget=600, backend='recording')
+        self.assertTrue(all(t <= 60 for t in timeouts[1:-1]))
+        self.assertEqual(timeouts[-1], 600)
+        self.assertEqual(self.analyzer.solver.configuration.timeout, 600)
+
+    def test_create_backend(self):
+        with self.assertRaises(ValueError):
+            create_backend('cplex')
+
     def test_filter_reaction_by_subsystems(self):
         reactions = self.analyzer.filter_reaction_by_subsystems()
         self.assertTrue(len(self.analyzer.reactions) > len(reactions))
         num_systems = set(r.subsystem for r in self.analyzer.reactions)
         self.assertTrue(len(num_systems) * 3 >= len(reactions))
+
+
+class TestPresolve(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = BaseFVA.create_for('e_coli_core')
+        self.presolve = Presolve.compute(self.analyzer)
+
+    def test_compute(self):
+        for i, (representative, ratio) in self.presolve.coupling.items():
+            self.assertNotIn(i, self.presolve.blocked)
+            self.assertNotIn(representative, self.presolve.coupling)
+            self.assertNotEqual(ratio, 0)
+
+    def test_analyze(self):
+        expected = self.analyzer.copy().analyze({'fru_e': 1.1}).data_frame
+        results = self.analyzer.copy().analyze(
+            {'fru_e': 1.1}, presolve=self.presolve)
+        df = results.data_frame.loc[expected.index]
+        self.assertTrue(((df - expected).abs() < 1e-6).all().all())
+        self.assertEqual(results.solver_report['lps'] +
+                         results.solver_report['skipped_lps'],
+                         2 * len(self.analyzer.reactions))
+
+    def test_analyze_prune(self):
+        results = self.analyzer.copy().analyze(
+            {'fru_e': 1.1}, presolve=self.presolve, prune=True,
+            max_distance=1)
+        report = results.solver_report
+        self.assertTrue(report['pruned'] > 0)
+        self.assertEqual(report['max_distance'], 1)
+        self.assertEqual(report['solved'], len(self.analyzer.reactions))
+
+        expected = self.analyzer.copy().analyze({'fru_e': 1.1}).data_frame
+        df = results.data_frame.loc[expected.index]
+        affected = self.presolve.affected_reactions([
+            r.id for r in self.analyzer.metabolites.get_by_id(
+                'fru_e').producers(True)
+        ], 1)
+        solved = [i for i in expected.index if i in affected]
+        pruned = [i for i in expected.index if i not in affected]
+        self.assertTrue(((df.loc[solved] - expected.loc[solved]).abs() <
+                         1e-6).all().all())
+        # baseline ranges without objective contain exact ranges
+        tolerance = 1e-6
+        self.assertTrue((df.loc[pruned].lower_bound <=
+                         expected.loc[pruned].lower_bound + tolerance).all())
+        self.assertTrue((df.loc[pruned].upper_bound >=
+                         expected.loc[pruned].upper_bound - tolerance).all())
+
+    def test_analyze_prune_requires_presolve(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.copy().analyze({'fru_e': 1.1}, prune=True)
+
+    def test_analyze_prune_requires_distance(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.copy().analyze(
+                {'fru_e': 1.1}, presolve=self.presolve, prune=True)
+
+    def test_kernel_coupling_covers_chains(self):
+        chains = Presolve._linear_chains(self.analyzer, self.presolve.blocked)
+        coupling = self.presolve.coupling
+        for i, (representative, ratio) in chains.items():
+            (root, k) = coupling.get(i, (i, 1.))
+            (representative_root, representative_k) = coupling.get(
+                representative, (representative, 1.))
+            self.assertEqual(root, representative_root)
+            self.assertAlmostEqual(k, ratio * representative_k)
+
+    def test_expand(self):
+        presolve = Presolve(['A'], {'C': ('B', -2.)})
+        (ranges, unsolved) = presolve.expand(['A', 'B', 'C', 'D'],
+                                             {'B': (1., 3.)})
+        self.assertEqual(ranges, {'A': (0., 0.), 'B': (1., 3.),
+                                  'C': (-6., -2.)})
+        self.assertEqual(unsolved, {'D'})
+
+
+class TestKnockoutScreen(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = BaseFVA.create_for('e_coli_core')
+
+    def test_screen(self):
+        screen = KnockoutScreen(self.analyzer, {'fru_e': 1.1}, n_jobs=1)
+        subsystems = sorted(set(r.subsystem for r in self.analyzer.reactions))
+        df = screen.screen(subsystems[:3])
+        self.assertEqual(list(df.index), subsystems[:3])
+        self.assertEqual(list(df.columns), subsystems)
+        self.assertEqual(len(screen.model.solver.constraints),
+                         len(self.analyzer.solver.constraints))
+
+    def test_screen_fva_reactions(self):
+        screen = KnockoutScreen(self.analyzer, {'fru_e': 1.1}, method='fva',
+                                level='reaction', n_jobs=2)
+        ids = [r.id for r in self.analyzer.reactions[:2]]
+        serial = KnockoutScreen(self.analyzer, {'fru_e': 1.1}, method='fva',
+                                level='reaction', n_jobs=1).screen(ids)
+        df = screen.screen(ids)
+        self.assertTrue(df.isnull().equals(serial.isnull()))
+        self.assertTrue(df.notnull().all(axis=1).any())
+        self.assertTrue(((df - serial).abs().fillna(0) < 1e-6).all().all())
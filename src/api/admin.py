@@ -3,8 +3,30 @@ from flask_admin import Admin
 
 from .app import app
 from .models import Analysis, User, db
+from .similarity import disease_index, analysis_index
+from .cache import invalidate_analysis
+
+
+class AnalysisView(ModelView):
+    column_exclude_list = ('results_pathway', 'results_reaction')
+    column_details_exclude_list = column_exclude_list
+    form_excluded_columns = column_exclude_list
+    page_size = 50
+
+    def after_model_change(self, form, model, is_created):
+        disease_index.update(model)
+        analysis_index.update(model)
+        type_field = getattr(form, 'type', None)
+        invalidate_analysis(
+            model, [type_field.object_data] if type_field else [])
+
+    def after_model_delete(self, model):
+        disease_index.remove(model.id)
+        analysis_index.remove(model.id)
+        invalidate_analysis(model)
+
 
 admin = Admin(app, name='microblog', template_mode='bootstrap3')
 
 admin.add_view(ModelView(User, db.session))
-admin.add_view(ModelView(Analysis, db.session))
+admin.add_view(AnalysisView(Analysis, db.session))
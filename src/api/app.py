@@ -15,6 +15,10 @@ config = {
 
 app.config.from_object(config[os.getenv('FLASK_CONFIGURATION', 'development')])
 
+if app.config['FVA_PRUNE'] and app.config['FVA_PRUNE_DISTANCE'] is None:
+    # pruning by whole connected component skips almost nothing
+    raise ValueError('FVA_PRUNE requires FVA_PRUNE_DISTANCE')
+
 from .celery import celery
 from .models import *
 from .auth import *
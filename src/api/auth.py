@@ -1,8 +1,13 @@
 from flask_jwt import JWT
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import safe_str_cmp
 
 from .app import app
-from .models import User
+from .cache import LRUCache
+from .models import User, db
+
+identity_cache = LRUCache(app.config['JWT_IDENTITY_CACHE_SIZE'],
+                          app.config['JWT_IDENTITY_CACHE_TTL'])
 
 
 def authenticate(email, password):
@@ -13,7 +18,30 @@ def authenticate(email, password):
 
 
 def identity(payload):
-    return User.query.get(payload['identity'])
+    '''
+    Identity of token which is cached by user id and issue time of token
+    to not query user in every request
+    '''
+    key = (payload['identity'], payload.get('iat'))
+    values = identity_cache.get(key)
+    if values is None:
+        user = User.query.get(payload['identity'])
+        if user:
+            identity_cache.set(key, {
+                c.name: getattr(user, c.name)
+                for c in User.__table__.columns
+            })
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_identity(user_id):
+    for key in identity_cache.keys():
+        if key[0] == user_id:
+            identity_cache.delete(key)
 
 
 jwt = JWT(app, authenticate, identity)
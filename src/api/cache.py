@@ -0,0 +1,134 @@
+import ast
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+from .app import app
+
+logger = logging.getLogger('api')
+
+
+class LRUCache:
+    '''
+    Thread safe in process cache which evicts least recently used items.
+    Items expire after ttl seconds if it is given.
+    '''
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            (expires, value) = self._items[key]
+            if expires is not None and expires < time.time():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._items[key] = (expires, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisCache:
+    '''
+    Cache shared between processes over redis with interface of LRUCache.
+    Values are pickled and errors of redis are logged as cache misses.
+    '''
+
+    def __init__(self, url, prefix='metabolitics:', ttl=None):
+        import redis
+        self.client = redis.StrictRedis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._errors = redis.RedisError
+
+    def _key(self, key):
+        return '%s%r' % (self.prefix, key)
+
+    def get(self, key, default=None):
+        try:
+            value = self.client.get(self._key(key))
+        except self._errors as e:
+            logger.warning('cache get failed: %s' % e)
+            return default
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), pickle.dumps(value), ex=self.ttl)
+        except self._errors as e:
+            logger.warning('cache set failed: %s' % e)
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except self._errors as e:
+            logger.warning('cache delete failed: %s' % e)
+
+    def keys(self):
+        return [
+            ast.literal_eval(k.decode('utf-8')[len(self.prefix):])
+            for k in self.client.scan_iter('%s*' % self.prefix)
+        ]
+
+    def clear(self):
+        for k in self.client.scan_iter('%s*' % self.prefix):
+            self.client.delete(k)
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def create_cache(url=None, maxsize=128, ttl=None):
+    '''
+    Redis cache if redis url is given otherwise in process LRUCache
+    '''
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, ttl=ttl)
+    return LRUCache(maxsize, ttl)
+
+
+# responses are invalidated by workers, so they are cached in redis
+# of result backend unless configured otherwise. Entries of in process
+# fallback are not invalidated and expire after RESPONSE_CACHE_TTL.
+response_cache = create_cache(app.config['RESPONSE_CACHE_URL'],
+                              maxsize=app.config['RESPONSE_CACHE_SIZE'],
+                              ttl=app.config['RESPONSE_CACHE_TTL'])
+
+
+def invalidate_analysis(analysis, types=()):
+    '''
+    Removes cached responses of analysis and generation of lists
+    of its type, so pages of old generation are not used anymore
+    '''
+    response_cache.delete(('analysis-detail', analysis.id))
+    for t in set([analysis.type, *types]):
+        response_cache.delete(('analysis-list', t))
@@ -11,11 +11,69 @@ class BaseConfig:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_EXPIRATION_DELTA = datetime.timedelta(days=25)
+    JWT_IDENTITY_CACHE_TTL = 60
+    JWT_IDENTITY_CACHE_SIZE = 1024
 
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL',
                                   'redis://localhost:6379')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND',
                                       'redis://localhost:6379')
+    CELERY_DEFAULT_QUEUE = 'interactive'
+    CELERY_ACKS_LATE = True
+    CELERYD_PREFETCH_MULTIPLIER = 1
+    BROKER_TRANSPORT_OPTIONS = {
+        'priority_steps': list(range(10)),
+        'queue_order_strategy': 'priority'
+    }
+
+    # default priority of queues where 0 is the highest
+    ANALYSIS_QUEUE_PRIORITIES = {'interactive': 0, 'bulk': 5, 'disease': 8}
+    # running fva tasks of a user, others wait in queue and are
+    # retried after USER_SLOT_RETRY_DELAY seconds
+    USER_CONCURRENCY_LIMIT = 4
+    USER_SLOT_RETRY_DELAY = 30
+    USER_PENDING_LIMIT = 1000
+
+    # fba previews are only run for submissions to these queues, so
+    # batches of bulk and disease analyses do not flood preview queue
+    ANALYSIS_PREVIEW_QUEUES = ['interactive']
+    # previews are short fba runs, so a worker dedicated to this queue
+    # delivers them while other workers are busy with fva
+    PREVIEW_QUEUE = 'preview'
+    # seconds of fva of a sample and of each of its LPs
+    FVA_TIME_BUDGET = None
+    FVA_REACTION_TIME_BUDGET = 10 * 60
+    FVA_LP_DUMP_DIR = os.getenv('FVA_LP_DUMP_DIR')
+    # blocked and coupled reactions of model are cached next to it
+    FVA_PRESOLVE = True
+    # approximates ranges of reactions far from measured metabolites
+    # by their ranges without objective which are outer bounds of exact
+    # ones, requires FVA_PRESOLVE and a distance in reactions
+    FVA_PRUNE = False
+    FVA_PRUNE_DISTANCE = 3
+    # LP backend of FVA in analysis.lp_backend.backends
+    FVA_BACKEND = 'optlang'
+    PROGRESS_INTERVAL = 1
+    # status requests wait at most STATUS_POLL_TIMEOUT seconds for change
+    # since they hold a sync worker of gunicorn while waiting
+    STATUS_POLL_INTERVAL = 1
+    STATUS_POLL_TIMEOUT = 10
+
+    API_MODEL_PATH = os.getenv('API_MODEL_PATH', '../models/api_model.p')
+    API_MODEL_VERSION = os.getenv('API_MODEL_VERSION')
+    DUPLICATE_PENDING_TIMEOUT = datetime.timedelta(hours=6)
+
+    REACTION_SCORE_THRESHOLD = 1e-3
+
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL',
+                                   CELERY_RESULT_BACKEND)
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 300
+
+    HEATMAP_CACHE_SIZE = 64
+    HEATMAP_MAX_EXACT = 1000
+    HEATMAP_MAX_PATHWAYS = None
+
     try:
         SECRET_KEY = open('../secret.txt').read()
     except:
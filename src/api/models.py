@@ -2,17 +2,37 @@ import uuid
 import datetime
 import json
 
-from sqlalchemy import and_, or_
-from sqlalchemy.types import Float
+from sqlalchemy import and_, or_, true
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.declarative import declared_attr
 from flask_sqlalchemy import SQLAlchemy, BaseQuery
-from flask_jwt import jwt_required, current_identity, _jwt_required
+from flask_jwt import jwt_required, current_identity, _jwt_required, \
+    JWTError
 
 from .app import app
 
 db = SQLAlchemy(app)
 
 
+def change_criterion(score, change):
+    return score > 0 if change >= 0 else score < 0
+
+
+def amount_criterion(score, qualifier, amount):
+    if not (qualifier and amount):
+        return true()
+    if qualifier == 'lt':
+        return amount >= score
+    elif qualifier == 'gt':
+        return score >= amount
+    elif qualifier == 'eq':
+        return or_(score + 10 >= amount, score - 10 <= amount)
+    else:
+        raise ValueError(
+            'qualifier should be lt, gt or eq but not %s ' % qualifier)
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255))
@@ -34,74 +54,151 @@ class Analysis(db.Model):
     type = db.Column(db.String(255))
     start_time = db.Column(db.DateTime, nullable=True)
     end_time = db.Column(db.DateTime, nullable=True)
-    results_pathway = db.Column(JSON)
-    results_reaction = db.Column(JSON)
+    results_pathway = db.deferred(db.Column(JSON))
+    results_reaction = db.deferred(db.Column(JSON))
+    sample_count = db.Column(db.Integer, default=1)
+    completed_samples = db.Column(db.Integer, default=0)
+    fingerprint = db.Column(db.String(64), index=True)
+    queue = db.Column(db.String(32), nullable=True)
+    preview = db.Column(db.Boolean, default=False)
+    solver_report = db.deferred(db.Column(JSON))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     user = db.relationship("User", back_populates="analysis")
 
     class AnalysisQuery(BaseQuery):
-        def get_pathway_score(self, pathway):
-            return Analysis.results_pathway[0][pathway].astext.cast(Float)
+        def filter_by_score(self, score_table, key, criterion):
+            '''
+            Filters analyses whose score of key in score table
+            satisfies criterion
+            '''
+            return self.filter(Analysis.id.in_(
+                db.session.query(score_table.analysis_id).filter(
+                    score_table.key_column() == key,
+                    criterion(score_table.score))))
+
+        def filter_by_pathway_score(self, pathway, criterion):
+            return self.filter_by_score(AnalysisPathwayScore, pathway,
+                                        criterion)
+
+        def filter_by_reaction_score(self, reaction, criterion):
+            return self.filter_by_score(AnalysisReactionScore, reaction,
+                                        criterion)
 
         def filter_by_change(self, pathway, change):
-            score = self.get_pathway_score(pathway)
-            return self.filter(score > 0 if change >= 0 else score < 0)
+            return self.filter_by_pathway_score(
+                pathway, lambda score: change_criterion(score, change))
 
         def for_many(self, iterable, func):
             f = self
             for i in iterable:
-                f = func(i)
+                f = func(f, i)
             return f
 
         def filter_by_change_many(self, data):
             return self.for_many(
                 data,
-                lambda x: self.filter_by_change(x['pathway'], x['change']))
+                lambda f, x: f.filter_by_change(x['pathway'], x['change']))
 
         def filter_by_change_amount(self, pathway, qualifier, amount):
             if not (qualifier and amount):
                 return self
-
-            score = self.get_pathway_score(pathway)
-            if qualifier == 'lt':
-                return self.filter(amount >= score)
-            elif qualifier == 'gt':
-                return self.filter(score >= amount)
-            elif qualifier == 'eq':
-                return self.filter(
-                    or_(score + 10 >= amount, score - 10 <= amount))
-            else:
-                raise ValueError(
-                    'qualifier should be lt, gt or eq but not %s ' % qualifier)
+            return self.filter_by_pathway_score(
+                pathway,
+                lambda score: amount_criterion(score, qualifier, amount))
 
         def filter_by_change_amount_many(self, data):
             return self.for_many(
                 data,
-                lambda x: self.filter_by_change_amount(x['pathway'], x['qualifier'], x['amount'])
+                lambda f, x: f.filter_by_change_amount(x['pathway'], x['qualifier'], x['amount'])
             )
 
-        def filter_by_authentication(self):
-            filter_type = Analysis.type.in_(['public', 'disease'])
+        def filter_by_changes(self, score_table, data):
+            '''
+            Conjunction of change and amount filters of all items
+            with one indexed subquery per item
+            '''
+            key = score_table.key_column().key
+            return self.for_many(
+                data,
+                lambda f, x: f.filter_by_score(
+                    score_table, x[key], lambda score: and_(
+                        change_criterion(score, x['change']),
+                        amount_criterion(score, x.get('qualifier'),
+                                         x.get('amount')))))
 
-            try:
-                _jwt_required(app.config['JWT_DEFAULT_REALM'])
-            except:
-                pass
+        def filter_by_pathway_changes(self, data):
+            return self.filter_by_changes(AnalysisPathwayScore, data)
+
+        def filter_by_reaction_changes(self, data):
+            return self.filter_by_changes(AnalysisReactionScore, data)
+
+        def filter_pending(self):
+            '''
+            Running analyses, ones which are older than
+            DUPLICATE_PENDING_TIMEOUT are considered as failed
+            as well as unfinished ones which have end time
+            '''
+            started_after = datetime.datetime.now() - \
+                app.config['DUPLICATE_PENDING_TIMEOUT']
+            return self.filter(Analysis.status == False,
+                               Analysis.end_time == None,
+                               Analysis.start_time > started_after)
 
-            if not current_identity:
+        def filter_by_authentication(self):
+            filter_type = Analysis.type.in_(Analysis.public_types)
+
+            identity = Analysis.authenticated_identity()
+            if not identity:
                 return self.filter(filter_type)
             return self.filter(
-                or_(filter_type, Analysis.user.has(id=current_identity.id)))
+                or_(filter_type, Analysis.user_id == identity.id))
 
     query_class = AnalysisQuery
 
-    def __init__(self, name, user, status=False, type='private'):
+    public_types = ['public', 'disease']
+
+    def __init__(self, name, user, status=False, type='private',
+                 sample_count=1):
         self.name = name
         self.status = status
         self.type = type
+        self.sample_count = sample_count
+        self.completed_samples = 0
         self.start_time = datetime.datetime.now()
         self.user = user
 
+    def copy_results(self, analysis):
+        '''
+        Fills analysis with results of other analysis of same measurements
+        '''
+        self.results_reaction = analysis.results_reaction
+        self.results_pathway = analysis.results_pathway
+        self.completed_samples = analysis.completed_samples
+        self.solver_report = analysis.solver_report
+        self.preview = False
+        self.status = True
+        self.end_time = datetime.datetime.now()
+
+    def find_duplicate(self):
+        '''
+        Finds finished or running analysis with the same fingerprint.
+        Running ones which are older than DUPLICATE_PENDING_TIMEOUT
+        are considered as failed.
+        '''
+        if not self.fingerprint:
+            return None
+        started_after = datetime.datetime.now() - \
+            app.config['DUPLICATE_PENDING_TIMEOUT']
+        with db.session.no_autoflush:
+            return Analysis.query.options(
+                undefer('results_pathway'),
+                undefer('results_reaction')).filter_by(
+                fingerprint=self.fingerprint).filter(
+                    or_(Analysis.status == True,
+                        and_(Analysis.end_time == None,
+                             Analysis.start_time > started_after))).order_by(
+                            Analysis.status.desc(), Analysis.id).first()
+
     def clean_name_tag(self, dataset):
         cleaned_dataset = list()
         for d in dataset:
@@ -109,11 +206,32 @@ class Analysis(db.Model):
         return cleaned_dataset
 
     def authenticated(self):
-        if self.type in ['private', 'noise']:
-            _jwt_required(app.config['JWT_DEFAULT_REALM'])
-            return self.user_id == current_identity.id
+        return Analysis.authorized(self.type, self.user_id)
+
+    @staticmethod
+    def authorized(type, user_id):
+        '''
+        Checks access to analysis by its type and owner
+        so that it can be done without loading analysis
+        '''
+        if type in ['private', 'noise']:
+            identity = Analysis.authenticated_identity()
+            return identity is not None and user_id == identity.id
         return True
 
+    @staticmethod
+    def authenticated_identity():
+        '''
+        Identity of request if it has valid token otherwise None.
+        Token is decoded once per request.
+        '''
+        if current_identity._get_current_object() is None:
+            try:
+                _jwt_required(app.config['JWT_DEFAULT_REALM'])
+            except JWTError:
+                pass
+        return current_identity._get_current_object()
+
     @staticmethod
     def get_multiple(ids):
         return Analysis.query.filter(
@@ -121,3 +239,85 @@ class Analysis(db.Model):
 
     def __repr__(self):
         return '<Analysis %r>' % self.name
+
+
+class ScoreMixin:
+    '''
+    Scores of first sample of analyses in normalized table
+    to search analyses by change with index of (key, score)
+    '''
+    score = db.Column(db.Float)
+
+    @declared_attr
+    def analysis_id(cls):
+        return db.Column(
+            db.Integer,
+            db.ForeignKey('analysis.id', ondelete='CASCADE'),
+            primary_key=True,
+            index=True)
+
+    @classmethod
+    def key_column(cls):
+        raise NotImplementedError()
+
+    @classmethod
+    def results(cls, analysis):
+        raise NotImplementedError()
+
+    @classmethod
+    def store(cls, analysis):
+        '''
+        Replaces scores of analysis with its results
+        '''
+        db.session.query(cls).filter_by(analysis_id=analysis.id).delete(
+            synchronize_session=False)
+        results = cls.results(analysis)
+        if results:
+            db.session.execute(cls.__table__.insert(), [{
+                'analysis_id': analysis.id,
+                cls.key_column().key: key,
+                'score': score
+            } for key, score in results.items()])
+
+    def __repr__(self):
+        return '<%s %r %r>' % (type(self).__name__, self.analysis_id,
+                               getattr(self, self.key_column().key))
+
+
+class AnalysisPathwayScore(ScoreMixin, db.Model):
+    pathway = db.Column(db.String(255), primary_key=True)
+
+    __table_args__ = (db.Index('ix_analysis_pathway_score_pathway_score',
+                               'pathway', 'score'), )
+
+    @classmethod
+    def key_column(cls):
+        return cls.pathway
+
+    @classmethod
+    def results(cls, analysis):
+        if analysis.results_pathway:
+            return analysis.results_pathway[0]
+
+
+class AnalysisReactionScore(ScoreMixin, db.Model):
+    '''
+    Only scores whose absolute values are larger than
+    REACTION_SCORE_THRESHOLD are stored, so reactions without
+    notable change do not match any change filter.
+    '''
+    reaction = db.Column(db.String(255), primary_key=True)
+
+    __table_args__ = (db.Index('ix_analysis_reaction_score_reaction_score',
+                               'reaction', 'score'), )
+
+    @classmethod
+    def key_column(cls):
+        return cls.reaction
+
+    @classmethod
+    def results(cls, analysis):
+        if analysis.results_reaction:
+            threshold = app.config['REACTION_SCORE_THRESHOLD']
+            return {k: v for k, v in analysis.results_reaction[0].items()
+                    if abs(v) >= threshold}
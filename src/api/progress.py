@@ -0,0 +1,88 @@
+import json
+import time
+import logging
+
+from .app import app, celery
+
+logger = logging.getLogger('api')
+
+
+def progress_key(analysis_id, sample=0):
+    return 'analysis-progress:%d:%d' % (analysis_id, sample)
+
+
+class ProgressReporter:
+    '''
+    Writes fva progress of sample of analysis into result backend
+    at most once in interval seconds and always when it is completed
+    '''
+
+    def __init__(self, analysis_id, sample=0,
+                 interval=app.config['PROGRESS_INTERVAL']):
+        self.key = progress_key(analysis_id, sample)
+        self.interval = interval
+        self.started = time.time()
+        self._written = 0
+
+    def __call__(self, solved, total):
+        now = time.time()
+        if solved < total and now - self._written < self.interval:
+            return
+        self._written = now
+        try:
+            celery.backend.set(self.key, json.dumps({
+                'solved': solved,
+                'total': total,
+                'started': self.started,
+                'updated': now
+            }))
+        except Exception as e:
+            # progress is informative so it should not fail analysis
+            logger.warning('progress of %s is not written: %s' %
+                           (self.key, e))
+
+
+def read_progress(analysis_id, sample_count=1):
+    '''
+    Progress records of samples of analysis, None if sample is not started
+    or progress can not be read from result backend
+    '''
+    try:
+        values = celery.backend.mget(
+            [progress_key(analysis_id, i) for i in range(sample_count)])
+        return [json.loads(v.decode('utf-8')) if v else None
+                for v in values]
+    except Exception as e:
+        logger.warning('progress of analysis %d is not read: %s' %
+                       (analysis_id, e))
+        return [None] * sample_count
+
+
+def clear_progress(analysis_id, sample_count=1):
+    try:
+        for i in range(sample_count):
+            celery.backend.delete(progress_key(analysis_id, i))
+    except Exception as e:
+        logger.warning('progress of analysis %d is not cleared: %s' %
+                       (analysis_id, e))
+
+
+def summarize_progress(samples, sample_count=1):
+    '''
+    Number of solved and total LPs of analysis and estimated
+    remaining seconds from rate of solved LPs
+    '''
+    started = [s for s in samples if s]
+    if not started:
+        return {'solved': 0, 'total': None, 'eta': None}
+
+    total = max(s['total'] for s in started) * sample_count
+    solved = sum(s['solved'] for s in started)
+    last_update = max(s['updated'] for s in started)
+    elapsed = last_update - min(s['started'] for s in started)
+
+    eta = None
+    if solved:
+        eta = max(elapsed * (total - solved) / solved -
+                  (time.time() - last_update), 0)
+    return {'solved': solved, 'total': total, 'eta': eta}
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 from flask_marshmallow import Marshmallow
 
 from .app import app
@@ -7,10 +7,29 @@ from .models import User, Analysis
 ma = Marshmallow(app)
 
 
+class Measurements(fields.Field):
+    '''
+    Concentration changes of one sample or list of samples
+    '''
+    default_error_messages = {
+        'invalid': 'Not a valid measurement or list of measurements.'
+    }
+
+    def _deserialize(self, value, attr, data):
+        if isinstance(value, dict):
+            return value
+        if isinstance(value, list) and value \
+                and all(isinstance(i, dict) for i in value):
+            return value
+        self.fail('invalid')
+
+
 class AnalysisInputSchema(Schema):
     name = fields.String(required=True)
     public = fields.Boolean(required=True)
-    concentration_changes = fields.Dict(required=True)
+    concentration_changes = Measurements(required=True)
+    priority = fields.Integer(validate=validate.Range(0, 9))
+    time_budget = fields.Number(validate=validate.Range(min=1))
 
 
 class PasswordChangeSchema(Schema):
@@ -46,3 +65,10 @@ class PathwayChangesScheme(Schema):
     change = fields.Integer(required=True)
     qualifier = fields.String(allow_none=True)
     amount = fields.Number(allow_none=True)
+
+
+class ReactionChangesScheme(Schema):
+    reaction = fields.String(required=True)
+    change = fields.Integer(required=True)
+    qualifier = fields.String(allow_none=True)
+    amount = fields.Number(allow_none=True)
@@ -0,0 +1,93 @@
+import json
+import zlib
+import hashlib
+
+import numpy as np
+
+encodings = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def negotiate_encoding(accept_encoding):
+    '''
+    Selects gzip or deflate from Accept-Encoding header if accepted
+    '''
+    accepted = dict()
+    for item in (accept_encoding or '').split(','):
+        (name, _, params) = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    candidates = [(accepted[e], e) for e in encodings
+                  if accepted.get(e, 0) > 0]
+    return max(candidates)[1] if candidates else None
+
+
+def json_chunks(samples, chunk_size=500):
+    '''
+    Serializes list of result dicts into json chunk by chunk
+    '''
+    if samples is None:
+        yield 'null'
+        return
+    yield '['
+    for i, sample in enumerate(samples):
+        yield '{' if i == 0 else ',{'
+        items = list(sample.items())
+        for j in range(0, len(items), chunk_size):
+            yield ('' if j == 0 else ',') + ','.join(
+                '%s:%s' % (json.dumps(k), json.dumps(v))
+                for k, v in items[j:j + chunk_size])
+        yield '}'
+    yield ']'
+
+
+def object_chunks(fields, streamed_fields):
+    '''
+    Serializes json object of fields and streamed fields
+    which are list of (name, chunk generator) pairs
+    '''
+    yield json.dumps(fields)[:-1] if fields else '{'
+    for i, (name, chunks) in enumerate(streamed_fields):
+        yield '%s%s:' % (',' if fields or i else '', json.dumps(name))
+        yield from chunks
+    yield '}'
+
+
+def compress(chunks, encoding):
+    '''
+    Compresses text or byte chunks with gzip or deflate encoding
+    '''
+    compressor = zlib.compressobj(6, zlib.DEFLATED, encodings[encoding])
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def result_index(samples):
+    '''
+    Sorted keys of results which is shared by analyses of same model
+    '''
+    return sorted(set(k for s in samples for k in s))
+
+
+def index_hash(index):
+    return hashlib.sha1(json.dumps(index).encode('utf-8')).hexdigest()
+
+
+def to_binary(samples, index):
+    '''
+    Little endian float32 matrix of samples ordered by index,
+    missing values are NaN
+    '''
+    matrix = np.full((len(samples), len(index)), np.nan, dtype='<f4')
+    for i, sample in enumerate(samples):
+        matrix[i, :] = [sample.get(k, np.nan) for k in index]
+    return matrix.tobytes()
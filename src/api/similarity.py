@@ -0,0 +1,197 @@
+import pickle
+import logging
+import threading
+
+from services import VectorIndex
+from .app import celery
+from .models import Analysis
+
+logger = logging.getLogger('api')
+
+
+class SharedIndex:
+    '''
+    Pathway vector index of analyses shared between web processes and
+    workers over redis of result backend. Each process builds index from db
+    and replays changes appended to journal in redis since it was built.
+    Writers only append to journal which is trimmed to max_journal_length
+    records, processes which fall behind trimmed records rebuild from db.
+    Without redis, changes are applied to index of writing process only.
+    '''
+
+    def __init__(self, name, types=None, attributes=('name', ),
+                 max_journal_length=10000, client=None):
+        self.journal_key = 'similarity-journal:%s' % name
+        self.base_key = 'similarity-journal-base:%s' % name
+        self.types = types
+        self.attributes = attributes
+        self.max_journal_length = max_journal_length
+        self._client = client
+        self._index = None
+        self._base = 0
+        self._position = 0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is not None:
+            return self._client
+        return getattr(celery.backend, 'client', None)
+
+    def query(self):
+        if self.types is None:
+            return Analysis.query
+        return Analysis.query.filter(Analysis.type.in_(self.types))
+
+    def build(self):
+        index = VectorIndex(self.attributes)
+        rows = self.query().filter(Analysis.status == True).with_entities(
+            Analysis.id, Analysis.results_pathway,
+            *[getattr(Analysis, a) for a in self.attributes])
+        for (id, results_pathway, *attributes) in rows.yield_per(1000):
+            if results_pathway:
+                index.upsert(id, results_pathway[0],
+                             **dict(zip(self.attributes, attributes)))
+        return index
+
+    def get(self):
+        with self._lock:
+            client = self.client
+            try:
+                records = None
+                if self._index is not None and client is not None:
+                    records = self._read(client)
+                if self._index is None or records is None:
+                    self._rebuild(client)
+                else:
+                    self._replay(records)
+            except Exception as e:
+                # stale index is better than failing similarity queries
+                logger.warning('index %s is not updated: %s' %
+                               (self.journal_key, e))
+                if self._index is None:
+                    self._index = self.build()
+            return self._index
+
+    def _rebuild(self, client):
+        '''
+        Builds index from db after end of journal is read, so changes
+        committed while building are replayed again which is idempotent
+        '''
+        if client is not None:
+            pipe = client.pipeline()
+            pipe.get(self.base_key)
+            pipe.llen(self.journal_key)
+            (base, length) = pipe.execute()
+            self._base = int(base or 0)
+            self._position = self._base + length
+        logger.info('building index %s' % self.journal_key)
+        self._index = self.build()
+
+    def _read(self, client):
+        '''
+        Journal records after position of index or None
+        if some of them are already trimmed
+        '''
+        while True:
+            pipe = client.pipeline()
+            pipe.get(self.base_key)
+            pipe.lrange(self.journal_key, self._position - self._base, -1)
+            (base, records) = pipe.execute()
+            base = int(base or 0)
+            if base == self._base:
+                return records
+            if base > self._position:
+                return None
+            # records were trimmed before read, so range is read again
+            self._base = base
+
+    def _replay(self, records):
+        '''
+        Applies journal records to index, callers hold lock of index
+        '''
+        for record in records:
+            self._position += 1
+            try:
+                (key, vector, attributes) = pickle.loads(record)
+            except Exception as e:
+                logger.warning('invalid record in %s: %s' %
+                               (self.journal_key, e))
+                continue
+            self._apply(key, vector, attributes)
+
+    def _apply(self, key, vector, attributes):
+        if vector is not None:
+            self._index.upsert(key, vector, **attributes)
+        elif key in self._index:
+            self._index.remove(key)
+
+    def _append(self, key, vector=None, attributes=None):
+        '''
+        Appends change to journal without loading index
+        '''
+        client = self.client
+        if client is None:
+            with self._lock:
+                if self._index is not None:
+                    self._apply(key, vector, attributes)
+            return
+        try:
+            length = client.rpush(self.journal_key,
+                                  pickle.dumps((key, vector, attributes)))
+            if length > self.max_journal_length:
+                trimmed = length - self.max_journal_length // 2
+                pipe = client.pipeline()
+                pipe.ltrim(self.journal_key, trimmed, -1)
+                pipe.incrby(self.base_key, trimmed)
+                pipe.execute()
+        except Exception as e:
+            logger.warning('change of %s is not appended to %s: %s' %
+                           (key, self.journal_key, e))
+
+    def reset(self):
+        '''
+        Drops journal, so every process rebuilds its index from db
+        '''
+        client = self.client
+        if client is None:
+            with self._lock:
+                self._index = None
+            return
+
+        def drop(pipe):
+            # base is moved past every position, so no reader keeps index
+            length = pipe.llen(self.journal_key)
+            pipe.multi()
+            pipe.delete(self.journal_key)
+            pipe.incrby(self.base_key, length + 1)
+
+        client.transaction(drop, self.journal_key)
+
+    def update(self, analysis):
+        '''
+        Adds or replaces analysis in index if it is finished or previewed
+        and its type is indexed, otherwise removes it from index
+        '''
+        if (analysis.status or analysis.preview) and \
+                analysis.results_pathway and \
+                (self.types is None or analysis.type in self.types):
+            self._append(analysis.id, analysis.results_pathway[0],
+                         {a: getattr(analysis, a) for a in self.attributes})
+        else:
+            self.remove(analysis.id)
+
+    def remove(self, analysis_id):
+        self._append(analysis_id)
+
+
+disease_index = SharedIndex('disease', types=['disease'])
+
+analysis_index = SharedIndex(
+    'analysis', attributes=('name', 'type', 'user_id'))
+
+
+def update_indexes(analyses):
+    for a in analyses:
+        disease_index.update(a)
+        analysis_index.update(a)
@@ -1,26 +1,257 @@
+import time
+import logging
 import datetime
-import pickle
+from contextlib import contextmanager
 
-from preprocessing import DynamicPreprocessing
-from .app import celery
-from .models import db, Analysis
+from celery import chord, group
+
+from .app import app, celery
+from .models import db, Analysis, AnalysisPathwayScore, \
+    AnalysisReactionScore
+from .worker import model_cache
+from .similarity import update_indexes
+from .cache import invalidate_analysis
+from .progress import ProgressReporter, clear_progress
+
+logger = logging.getLogger('api')
+
+
+def fva_budget(time_budget=None):
+    '''
+    Time budget of fva of sample where time budget of request
+    can not exceed the configured one
+    '''
+    budget = app.config['FVA_TIME_BUDGET']
+    if time_budget is not None:
+        budget = min(budget, time_budget) if budget else time_budget
+    return budget
+
+
+def result_options(time_budget=None):
+    '''
+    Options of fva which change results, so analyses are only
+    deduplicated if they share them
+    '''
+    options = {'budget': fva_budget(time_budget)}
+    if app.config['FVA_PRESOLVE'] and app.config['FVA_PRUNE']:
+        options.update({'prune': True,
+                        'prune_distance': app.config['FVA_PRUNE_DISTANCE']})
+    return options
+
+
+def fva_options(reporter, time_budget=None):
+    '''
+    Options of fva of sample
+    '''
+    return {
+        'progress': reporter,
+        'budget': fva_budget(time_budget),
+        'reaction_budget': app.config['FVA_REACTION_TIME_BUDGET'],
+        'dump_dir': app.config['FVA_LP_DUMP_DIR'],
+        'presolve': model_cache.presolve()
+        if app.config['FVA_PRESOLVE'] else None,
+        'prune': app.config['FVA_PRESOLVE'] and app.config['FVA_PRUNE'],
+        'max_distance': app.config['FVA_PRUNE_DISTANCE'],
+        'backend': app.config['FVA_BACKEND']
+    }
+
+
+@contextmanager
+def user_slot(task, analysis_id):
+    '''
+    Runs fva of analysis in one of USER_CONCURRENCY_LIMIT slots of its
+    owner. Slots are ids of running tasks in sorted set of result backend
+    scored by their start time, so redelivered tasks reuse their slot and
+    slots of crashed workers are pruned after DUPLICATE_PENDING_TIMEOUT.
+    Task is retried later if owner has no free slot.
+    '''
+    client = getattr(celery.backend, 'client', None)
+    user_id = Analysis.query.filter_by(id=analysis_id).with_entities(
+        Analysis.user_id).scalar()
+    if client is None or user_id is None:
+        yield
+        return
+
+    key = 'user-running:%d' % user_id
+    now = time.time()
+    timeout = app.config['DUPLICATE_PENDING_TIMEOUT'].total_seconds()
+    pipe = client.pipeline()
+    pipe.zremrangebyscore(key, '-inf', now - timeout)
+    pipe.zadd(key, now, task.request.id)
+    pipe.zcard(key)
+    pipe.expire(key, int(timeout))
+    (_, _, running, _) = pipe.execute()
+
+    if running > app.config['USER_CONCURRENCY_LIMIT']:
+        client.zrem(key, task.request.id)
+        db.session.rollback()
+        raise task.retry(countdown=app.config['USER_SLOT_RETRY_DELAY'],
+                         max_retries=None)
+    try:
+        yield
+    finally:
+        client.zrem(key, task.request.id)
+
+
+@celery.task(bind=True)
+def save_analysis(self, analysis_id, concentration_changes, time_budget=None):
+    fva_scaler = model_cache.fva_scaler()
+    with user_slot(self, analysis_id), fva_scaler.configured(
+            **fva_options(ProgressReporter(analysis_id), time_budget)):
+        results_reaction = model_cache.reaction_scaler().transform(
+            concentration_changes)
+    save_results(results_reaction, analysis_id, fva_scaler.reports)
 
 
 @celery.task()
-def save_analysis(analysis_id, concentration_changes):
+def preview_analysis(analysis_id, concentration_changes):
+    '''
+    Stores approximate results of analysis computed by fba
+    until they are replaced by results of fva
+    '''
+    try:
+        with model_cache.fva_scaler().approximating():
+            results_reaction = model_cache.reaction_scaler().transform(
+                concentration_changes)
+        results_pathway = model_cache.pathway_scaler().transform(
+            results_reaction)
+    except Exception as e:
+        # preview is optional, results come from fva anyway
+        logger.warning('preview of analysis %s failed: %s' % (analysis_id, e))
+        return
+
+    analysis = Analysis.query.filter_by(id=analysis_id).with_for_update().one()
+    if analysis.status:
+        db.session.rollback()
+        return
+    analysis.results_reaction = analysis.clean_name_tag(results_reaction)
+    analysis.results_pathway = analysis.clean_name_tag(results_pathway)
+    analysis.preview = True
+    AnalysisPathwayScore.store(analysis)
+    AnalysisReactionScore.store(analysis)
+    db.session.commit()
 
-    with open('../models/api_model.p', 'rb') as f:
-        reaction_scaler = pickle.load(f)
+    update_indexes([analysis])
+    invalidate_analysis(analysis)
 
-    pathway_scaler = DynamicPreprocessing(
-        ['pathway-scoring', 'transport-elimination'])
 
-    results_reaction = reaction_scaler.transform(concentration_changes)
-    results_pathway = pathway_scaler.transform(results_reaction)
+@celery.task(bind=True)
+def analyze_sample(self, analysis_id, concentration_changes, sample=0,
+                   time_budget=None):
+    '''
+    Runs fva of one sample of analysis and records it as completed
+    '''
+    fva_scaler = model_cache.fva_scaler()
+    with user_slot(self, analysis_id), fva_scaler.configured(**fva_options(
+            ProgressReporter(analysis_id, sample), time_budget)):
+        (result, ) = model_cache.reaction_scaler().transform(
+            concentration_changes)
+
+    Analysis.query.filter_by(id=analysis_id).update(
+        {Analysis.completed_samples: Analysis.completed_samples + 1},
+        synchronize_session=False)
+    db.session.commit()
+    return {'result': result, 'report': fva_scaler.reports[0]}
 
-    analysis = Analysis.query.get(analysis_id)
+
+@celery.task()
+def save_sample_results(samples, analysis_id):
+    '''
+    Saves results and solver reports of samples joined by chord
+    '''
+    save_results([s['result'] for s in samples], analysis_id,
+                 [s['report'] for s in samples])
+
+
+@celery.task()
+def save_results(results_reaction, analysis_id, solver_reports=None):
+    results_pathway = model_cache.pathway_scaler().transform(results_reaction)
+
+    analysis = Analysis.query.filter_by(id=analysis_id).with_for_update().one()
     analysis.results_reaction = analysis.clean_name_tag(results_reaction)
     analysis.results_pathway = analysis.clean_name_tag(results_pathway)
+    analysis.completed_samples = len(results_reaction)
+    analysis.solver_report = solver_reports
+    analysis.preview = False
     analysis.status = True
     analysis.end_time = datetime.datetime.now()
+
+    duplicates = list()
+    if analysis.fingerprint:
+        duplicates = Analysis.query.filter_by(
+            fingerprint=analysis.fingerprint, status=False,
+            end_time=None).filter(
+                Analysis.id != analysis.id).all()
+        for duplicate in duplicates:
+            duplicate.copy_results(analysis)
+
+    for a in [analysis] + duplicates:
+        AnalysisPathwayScore.store(a)
+        AnalysisReactionScore.store(a)
     db.session.commit()
+
+    update_indexes([analysis] + duplicates)
+    for a in [analysis] + duplicates:
+        invalidate_analysis(a)
+    clear_progress(analysis.id, analysis.sample_count or 1)
+
+
+@celery.task()
+def fail_analysis(analysis_id):
+    '''
+    Marks analysis whose workflow failed and duplicates attached to it
+    as failed by their end time, so they are not pending anymore
+    and same measurements can be submitted again
+    '''
+    analysis = Analysis.query.filter_by(id=analysis_id).with_for_update().one()
+    if analysis.status or analysis.end_time:
+        db.session.rollback()
+        return
+
+    failed = [analysis]
+    if analysis.fingerprint:
+        failed += Analysis.query.filter_by(
+            fingerprint=analysis.fingerprint, status=False,
+            end_time=None).filter(Analysis.id != analysis.id).all()
+    end_time = datetime.datetime.now()
+    for a in failed:
+        a.end_time = end_time
+    db.session.commit()
+
+    logger.error('analysis %d failed with %d duplicates' %
+                 (analysis_id, len(failed) - 1))
+    for a in failed:
+        invalidate_analysis(a)
+    clear_progress(analysis.id, analysis.sample_count or 1)
+
+
+def analysis_workflow(analysis_id, concentration_changes,
+                      queue='interactive', priority=None, time_budget=None):
+    '''
+    Creates task signature of analysis routed to queue with priority
+    where fva of each sample is limited to time_budget seconds.
+    Multi sample analyses are fanned out into one subtask per sample
+    and joined into analysis row by chord. If queue is one of
+    ANALYSIS_PREVIEW_QUEUES, fba preview is run on PREVIEW_QUEUE
+    alongside them.
+    If workflow fails, analysis and its duplicates are marked as failed.
+    '''
+    if priority is None:
+        priority = app.config['ANALYSIS_QUEUE_PRIORITIES'][queue]
+    options = {'queue': queue, 'priority': priority}
+
+    if isinstance(concentration_changes, dict):
+        workflow = save_analysis.si(analysis_id, concentration_changes,
+                                    time_budget).set(**options)
+    else:
+        workflow = chord(
+            (analyze_sample.si(analysis_id, x, i, time_budget).set(**options)
+             for i, x in enumerate(concentration_changes)),
+            save_sample_results.s(analysis_id).set(**options))
+    workflow.on_error(fail_analysis.si(analysis_id).set(**options))
+
+    if queue not in app.config['ANALYSIS_PREVIEW_QUEUES']:
+        return workflow
+    return group(
+        preview_analysis.si(analysis_id, concentration_changes).set(
+            queue=app.config['PREVIEW_QUEUE'], priority=priority), workflow)
@@ -1,9 +1,30 @@
+import os
+import datetime
+import json
+import time
+import gzip
+import pickle
+import tempfile
+import uuid
 import unittest
+from unittest import mock
 import flask_testing
+from celery import chord
+import numpy as np
 
 from .app import app, config
-from .models import Analysis, db
-from .tasks import save_analysis
+from .models import Analysis, AnalysisPathwayScore, AnalysisReactionScore, \
+    db, amount_criterion
+from .schemas import AnalysisInputSchema
+from .tasks import save_analysis, analysis_workflow
+from .worker import ModelCache
+from .serializers import *
+from .cache import LRUCache, create_cache
+from . import progress
+from .progress import ProgressReporter, read_progress, summarize_progress
+from .similarity import SharedIndex
+from .views.anaylsis import page_args, paginated
+from services import VectorIndex
 
 
 class ApiTests(flask_testing.TestCase):
@@ -27,6 +48,277 @@ class TaskTests(unittest.TestCase):
         # db.session.delete(self.analysis)
         # db.session.commit()
 
+    def test_analysis_workflow_preview(self):
+        workflow = analysis_workflow(1, {'h_c': 1})
+        (preview, analysis) = workflow.tasks
+        self.assertEqual(preview.options['queue'], app.config['PREVIEW_QUEUE'])
+        self.assertEqual(preview.options['priority'],
+                         analysis.options['priority'])
+
+        workflow = analysis_workflow(1, [{'h_c': 1}, {'h_c': 2}], 'disease')
+        self.assertIsInstance(workflow, chord)
+        self.assertEqual(workflow.tasks[0].options['queue'], 'disease')
+
+
+class SchemaTests(unittest.TestCase):
+    def test_analysis_input_many_samples(self):
+        schema = AnalysisInputSchema()
+        data = {'name': 'test', 'public': True}
+
+        (_, error) = schema.load(
+            dict(data, concentration_changes={'h_c': 1}))
+        self.assertFalse(error)
+
+        (loaded, error) = schema.load(
+            dict(data, concentration_changes=[{'h_c': 1}, {'h_c': 2}]))
+        self.assertFalse(error)
+        self.assertEqual(len(loaded['concentration_changes']), 2)
+
+        (_, error) = schema.load(dict(data, concentration_changes=[1]))
+        self.assertIn('concentration_changes', error)
+
+
+class SerializerTests(unittest.TestCase):
+    def setUp(self):
+        self.samples = [{'a': 1.5, 'b': -2}, {'c': 3}]
+
+    def test_json_chunks(self):
+        chunks = list(json_chunks(self.samples, chunk_size=1))
+        self.assertTrue(len(chunks) > 2)
+        self.assertEqual(json.loads(''.join(chunks)), self.samples)
+        self.assertEqual(''.join(json_chunks(None)), 'null')
+
+    def test_object_chunks(self):
+        data = ''.join(object_chunks({'id': 1}, [
+            ('results', json_chunks(self.samples)),
+            ('empty', json_chunks(None))
+        ]))
+        self.assertEqual(
+            json.loads(data),
+            {'id': 1, 'results': self.samples, 'empty': None})
+
+    def test_compress(self):
+        data = b''.join(compress(json_chunks(self.samples), 'gzip'))
+        self.assertEqual(json.loads(gzip.decompress(data).decode('utf-8')),
+                         self.samples)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(
+            negotiate_encoding('gzip;q=0.1, deflate;q=0.5'), 'deflate')
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding(None))
+
+    def test_to_binary(self):
+        index = result_index(self.samples)
+        self.assertEqual(index, ['a', 'b', 'c'])
+        matrix = np.frombuffer(
+            to_binary(self.samples, index), dtype='<f4').reshape(2, 3)
+        self.assertEqual(matrix[0, :2].tolist(), [1.5, -2])
+        self.assertEqual(matrix[1, 2], 3)
+        self.assertEqual(np.isnan(matrix).sum(), 3)
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        cache.delete('a')
+        self.assertEqual(len(cache), 1)
+
+    def test_ttl(self):
+        cache = LRUCache(2, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        cache.ttl = -1
+        cache.set('b', 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.keys(), ['a'])
+
+    def test_create_cache(self):
+        cache = create_cache(maxsize=4, ttl=10)
+        self.assertIsInstance(cache, LRUCache)
+        self.assertEqual((cache.maxsize, cache.ttl), (4, 10))
+        cache = create_cache('rpc://', maxsize=4)
+        self.assertIsInstance(cache, LRUCache)
+
+
+class PaginationTests(unittest.TestCase):
+    def test_page_args(self):
+        with app.test_request_context('/?page=2&per_page=500'):
+            self.assertEqual(page_args(), (2, 100))
+        with app.test_request_context('/'):
+            self.assertEqual(page_args(), (None, None))
+
+    def test_invalid_page_args(self):
+        for query in ['page=0', 'page=1&per_page=-1', 'page=a']:
+            with app.test_request_context('/?%s' % query):
+                with self.assertRaises(ValueError):
+                    page_args()
+                (response, status) = paginated(Analysis.query)
+                self.assertEqual(status, 400)
+                self.assertIn(
+                    'page', json.loads(response.get_data(as_text=True)))
+
+
+class ProgressTests(unittest.TestCase):
+    def test_summarize_progress(self):
+        self.assertEqual(
+            summarize_progress([None, None], 2),
+            {'solved': 0, 'total': None, 'eta': None})
+
+        now = time.time()
+        summary = summarize_progress([{
+            'solved': 100, 'total': 100, 'started': now - 20,
+            'updated': now - 10
+        }, {
+            'solved': 50, 'total': 100, 'started': now - 10, 'updated': now
+        }, None], 3)
+        self.assertEqual((summary['solved'], summary['total']), (150, 300))
+        self.assertAlmostEqual(summary['eta'], 20, delta=1)
+
+    def test_read_progress_bytes(self):
+        class RedisBackend:
+            '''Stores values as bytes like redis result backend'''
+
+            def __init__(self):
+                self.values = dict()
+
+            def set(self, key, value):
+                self.values[key] = value.encode('utf-8')
+
+            def mget(self, keys):
+                return [self.values.get(k) for k in keys]
+
+        app = mock.Mock(backend=RedisBackend())
+        with mock.patch.object(progress, 'celery', app):
+            ProgressReporter(1, sample=1)(10, 20)
+            samples = read_progress(1, sample_count=2)
+        self.assertIsNone(samples[0])
+        self.assertEqual((samples[1]['solved'], samples[1]['total']),
+                         (10, 20))
+
+
+class ModelCacheTests(unittest.TestCase):
+    def setUp(self):
+        (fd, self.path) = tempfile.mkstemp()
+        os.close(fd)
+        self.cache = ModelCache(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def dump(self, obj, mtime):
+        with open(self.path, 'wb') as f:
+            pickle.dump(obj, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_reaction_scaler(self):
+        self.dump({'version': 1}, 1000)
+        scaler = self.cache.reaction_scaler()
+        self.assertEqual(scaler, {'version': 1})
+        self.assertIs(self.cache.reaction_scaler(), scaler)
+
+        self.dump({'version': 2}, 2000)
+        self.assertEqual(self.cache.reaction_scaler(), {'version': 2})
+
+    def test_reload_publishes_version(self):
+        cache = ModelCache(self.path, version='pinned')
+        self.dump({'version': 1}, 1000)
+        with mock.patch.object(cache, 'publish_version',
+                               return_value=False) as publish:
+            cache.reaction_scaler()
+            cache.reaction_scaler()
+            self.assertEqual(publish.call_count, 2)
+            publish.return_value = True
+            cache.reaction_scaler()
+            cache.reaction_scaler()
+            self.assertEqual(publish.call_count, 3)
+
+            digest = cache.digest()
+            cache._presolve = object()
+            self.dump({'version': 2}, 2000)
+            cache.reaction_scaler()
+            self.assertEqual(publish.call_count, 4)
+        self.assertIsNone(cache._presolve)
+        self.assertEqual(cache.version(), 'pinned')
+        self.assertNotEqual(cache.digest(), digest)
+
+
+class SharedIndexTests(unittest.TestCase):
+    class Index(SharedIndex):
+        '''Index built from rows dict instead of db'''
+
+        def __init__(self, rows, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.rows = rows
+            self.builds = 0
+
+        def build(self):
+            self.builds += 1
+            index = VectorIndex(self.attributes)
+            for key, vector in self.rows.items():
+                index.upsert(key, vector)
+            return index
+
+    def setUp(self):
+        import redis
+        self.client = redis.StrictRedis.from_url(
+            app.config['CELERY_RESULT_BACKEND'])
+        try:
+            self.client.ping()
+        except redis.RedisError:
+            self.skipTest('Require redis')
+        self.name = 'test-%s' % uuid.uuid4()
+        self.rows = {1: {'a': 1}}
+
+    def tearDown(self):
+        index = self.index()
+        self.client.delete(index.journal_key, index.base_key)
+
+    def index(self, **kwargs):
+        return self.Index(self.rows, self.name, client=self.client, **kwargs)
+
+    def test_append_without_loading(self):
+        (reader, writer) = (self.index(), self.index())
+        self.assertIn(1, reader.get())
+        writer._append(2, {'a': 2}, {'name': 'new'})
+        writer.remove(1)
+        self.assertEqual(writer.builds, 0)
+
+        index = reader.get()
+        self.assertEqual((2 in index, 1 in index), (True, False))
+        self.assertEqual(index.attributes['name'][index.rows[2]], 'new')
+        self.assertEqual(reader.builds, 1)
+
+    def test_trimmed_journal(self):
+        (reader, writer) = (self.index(), self.index(max_journal_length=4))
+        follower = self.index()
+        reader.get()
+        follower.get()
+        for i in range(10, 20):
+            writer._append(i, {'a': i}, dict())
+            follower.get()
+        self.assertEqual(len(follower.get()), 11)
+        self.assertEqual(follower.builds, 1)
+
+        self.rows[2] = {'a': 2}
+        self.assertIn(2, reader.get())
+        self.assertEqual(reader.builds, 2)
+
+    def test_reset(self):
+        reader = self.index()
+        reader.get()
+        self.index()._append(2, {'a': 2}, dict())
+        self.index().reset()
+        self.assertNotIn(2, reader.get())
+        self.assertEqual(reader.builds, 2)
+
 
 class ModelsTests(flask_testing.TestCase):
     def setUp(self):
@@ -51,6 +343,53 @@ class ModelsTests(flask_testing.TestCase):
         db.session.delete(self.analysis)
         db.session.commit()
 
+    def test_filter_by_pathway_changes(self):
+        self.analysis.results_pathway = [{'sa': 1, 'sb': -20}]
+        db.session.add(self.analysis)
+        db.session.flush()
+        AnalysisPathwayScore.store(self.analysis)
+        db.session.commit()
+
+        query = Analysis.query.filter(Analysis.id == self.analysis.id)
+        self.assertEqual(query.filter_by_pathway_changes([
+            {'pathway': 'sa', 'change': 1},
+            {'pathway': 'sb', 'change': -1, 'qualifier': 'lt', 'amount': -10}
+        ]).count(), 1)
+        self.assertEqual(query.filter_by_pathway_changes([
+            {'pathway': 'sa', 'change': 1},
+            {'pathway': 'sb', 'change': 1}
+        ]).count(), 0)
+
+        db.session.delete(self.analysis)
+        db.session.commit()
+
+    def test_find_duplicate_ignores_failed(self):
+        self.analysis.fingerprint = 'f' * 64
+        db.session.add(self.analysis)
+        db.session.commit()
+
+        duplicate = Analysis('duplicate', None)
+        duplicate.fingerprint = self.analysis.fingerprint
+        self.assertEqual(duplicate.find_duplicate().id, self.analysis.id)
+
+        self.analysis.end_time = datetime.datetime.now()
+        db.session.commit()
+        self.assertIsNone(duplicate.find_duplicate())
+        self.assertEqual(Analysis.query.filter(
+            Analysis.id == self.analysis.id).filter_pending().count(), 0)
+
+        db.session.delete(self.analysis)
+        db.session.commit()
+
+    def test_reaction_score_results(self):
+        self.analysis.results_reaction = [{'a': 1e-9, 'b': -2, 'c': 0}]
+        self.assertEqual(
+            AnalysisReactionScore.results(self.analysis), {'b': -2})
+
+    def test_amount_criterion(self):
+        with self.assertRaises(ValueError):
+            amount_criterion(AnalysisPathwayScore.score, 'ne', 1)
+
     def test_clean_name_tag(self):
         cleaned = self.analysis.clean_name_tag(self.reaction_result)
         expected = [{'a': 1, 'b': 2}]
@@ -1,17 +1,35 @@
+import json
+import time
+import logging
+import uuid
+import hashlib
+import datetime
 from functools import reduce
 
-from flask import jsonify, request
+from flask import jsonify, request, Response, stream_with_context
+from werkzeug.http import is_resource_modified
 from flask_jwt import jwt_required, current_identity
-from sqlalchemy import and_
-from sqlalchemy.types import Float
+from celery import group
+from sqlalchemy import and_, func, extract
+from sqlalchemy.orm import undefer
 
-from services import similarty_dict
+from services import measurement_fingerprint, NamingService, VectorIndex
 from visualization import HeatmapVisualization
 
-from ..app import app
+from ..app import app, celery
 from ..schemas import *
-from ..models import db, User, Analysis
-from ..tasks import save_analysis
+from ..models import db, User, Analysis, AnalysisPathwayScore, \
+    AnalysisReactionScore
+from ..tasks import analysis_workflow, result_options
+from ..worker import model_cache
+from ..similarity import disease_index, analysis_index, update_indexes
+from ..serializers import *
+from ..cache import LRUCache, response_cache, invalidate_analysis
+from ..progress import read_progress, summarize_progress
+
+logger = logging.getLogger('api')
+naming = NamingService('recon')
+heatmap_cache = LRUCache(app.config['HEATMAP_CACHE_SIZE'])
 
 
 @app.route('/analysis/fva', methods=['POST'])
@@ -41,7 +59,8 @@ def fva_analysis():
                   description: name of analysis
               concentration_changes:
                   type: object
-                  description: concentration changes of metabolitics
+                  description: concentration changes of metabolitics,
+                    or list of them to analyze many samples
     responses:
       200:
         description: Analysis info
@@ -49,22 +68,197 @@ def fva_analysis():
         description: Analysis not found
       401:
         description: Analysis is not yours
+      429:
+        description: Too many running analyses
     """
     (data, error) = AnalysisInputSchema().load(request.json)
     if error:
         return jsonify(error), 400
 
+    queue = select_queue('interactive')
+    if not queue:
+        return jsonify({'queue': ['Too many running analyses.']}), 429
+
+    analysis = new_analysis(data)
+    requires_analysis = deduplicate(analysis, dict())
+    if requires_analysis:
+        analysis.queue = queue
+    db.session.add(analysis)
+    commit_analyses([analysis])
+
+    analysis_id = analysis.id
+    if requires_analysis:
+        analysis_workflow(analysis_id, data['concentration_changes'], queue,
+                          data.get('priority'),
+                          data.get('time_budget')).apply_async()
+
+    return jsonify({'id': analysis_id})
+
+
+@app.route('/analysis/fva/batch', methods=['POST'])
+@jwt_required()
+def fva_analysis_batch():
+    """
+    FVA analysis of many measurements at once
+    ---
+    tags:
+      - analysis
+    parameters:
+        -
+          name: authorization
+          in: header
+          type: string
+          required: true
+        -
+          name: queue
+          in: query
+          type: string
+          enum: [bulk, disease]
+        - in: body
+          name: body
+          schema:
+            type: array
+            items:
+              $ref: "#/definitions/AnalysisInput"
+    responses:
+      200:
+        description: Ids of analyses in order of given measurements
+      429:
+        description: Too many running analyses
+    """
+    queue = request.args.get('queue', 'bulk')
+    if queue not in ['bulk', 'disease']:
+        return jsonify({'queue': ['should be bulk or disease']}), 400
+
+    (data, error) = AnalysisInputSchema(many=True).load(request.json)
+    if error:
+        return jsonify(error), 400
+
+    if not select_queue(queue, len(data)):
+        return jsonify({'queue': ['Too many running analyses.']}), 429
+
+    analyses = [new_analysis(d) for d in data]
+    fingerprints = dict()
+    requires_analysis = [deduplicate(a, fingerprints) for a in analyses]
+    for a, r in zip(analyses, requires_analysis):
+        if r:
+            a.queue = queue
+    db.session.add_all(analyses)
+    commit_analyses(analyses)
+
+    analysis_ids = [a.id for a in analyses]
+    group(analysis_workflow(i, d['concentration_changes'], queue,
+                            d.get('priority'), d.get('time_budget'))
+          for i, d, r in zip(analysis_ids, data, requires_analysis)
+          if r).apply_async()
+
+    return jsonify({'ids': analysis_ids})
+
+
+def select_queue(queue, num_analyses=1):
+    '''
+    Queue of submission of current user. Interactive submissions of users
+    who have many running analyses are demoted to bulk queue.
+    None if user exceeds limit of pending analyses. Running analyses
+    of user are limited by workers at dispatch time.
+    '''
+    pending = Analysis.query.filter_by(
+        user_id=current_identity.id).filter_pending().count()
+    if pending + num_analyses > app.config['USER_PENDING_LIMIT']:
+        return None
+    if queue == 'interactive' and \
+            pending >= app.config['USER_CONCURRENCY_LIMIT']:
+        return 'bulk'
+    return queue
+
+
+def new_analysis(data):
+    concentration_changes = data['concentration_changes']
     analysis = Analysis(
         data['name'],
         current_identity,
-        type='public' if data['public'] else 'private')
-    db.session.add(analysis)
+        type='public' if data['public'] else 'private',
+        sample_count=1 if isinstance(concentration_changes, dict) else len(
+            concentration_changes))
+    version = model_cache.published_version()
+    if version:
+        # analyses are not deduplicated until model version is known
+        analysis.fingerprint = measurement_fingerprint(
+            concentration_changes, version, naming,
+            options=result_options(data.get('time_budget')))
+    return analysis
+
+
+def commit_analyses(analyses):
+    '''
+    Commits new analyses and indexes ones already finished by deduplication
+    '''
+    db.session.flush()
+    finished = [a for a in analyses if a.status]
+    for a in finished:
+        AnalysisPathwayScore.store(a)
+        AnalysisReactionScore.store(a)
     db.session.commit()
+    update_indexes(finished)
+    for a in analyses:
+        invalidate_analysis(a)
 
-    analysis_id = analysis.id
-    save_analysis.delay(analysis_id, data['concentration_changes'])
 
-    return jsonify({'id': analysis_id})
+def deduplicate(analysis, fingerprints):
+    '''
+    Copies results of finished analysis of same measurements.
+    Returns False if there is no need to run analysis because
+    a duplicate is finished or running, then it is attached to that one.
+    fingerprints keeps analyses submitted in the same request.
+    '''
+    if not analysis.fingerprint:
+        return True
+    duplicate = fingerprints.get(analysis.fingerprint)
+    if duplicate:
+        if duplicate.status:
+            analysis.copy_results(duplicate)
+        return False
+    fingerprints[analysis.fingerprint] = analysis
+
+    duplicate = analysis.find_duplicate()
+    if duplicate and duplicate.status:
+        analysis.copy_results(duplicate)
+    return duplicate is None
+
+
+def page_args():
+    '''
+    Page and number of analyses per page in request which is at most 100,
+    page is None if it is not requested. Raises ValueError if they are
+    not positive integers.
+    '''
+    if 'page' not in request.args:
+        return (None, None)
+    (page, per_page) = (int(request.args['page']),
+                        int(request.args.get('per_page', 20)))
+    if page < 1 or per_page < 1:
+        raise ValueError('page and per_page should be at least 1')
+    return (page, min(per_page, 100))
+
+
+def paginated(query):
+    '''
+    Serializes analyses of query and paginates them if page is requested.
+    Total number of analyses is returned in X-Total-Count header.
+    '''
+    try:
+        (page, per_page) = page_args()
+    except ValueError:
+        return jsonify({'page': [
+            'page and per_page should be integers of at least 1.']}), 400
+    if page is None:
+        return AnalysisSchema(many=True).jsonify(query)
+
+    pagination = query.order_by(Analysis.id).paginate(
+        page, per_page, error_out=False)
+    response = AnalysisSchema(many=True).jsonify(pagination.items)
+    response.headers['X-Total-Count'] = pagination.total
+    return response
 
 
 @app.route('/analysis/set')
@@ -80,13 +274,28 @@ def user_analysis_set():
           in: header
           type: string
           required: true
+        -
+          name: exclude_reactions
+          in: query
+          type: boolean
+          required: false
+          description: leaves results_reaction out of the response
     """
-    analyses = list(Analysis.get_multiple(request.args.values()))
-    if len(analyses) != len(request.args):
+    args = request.args.to_dict()
+    exclude_reactions = \
+        args.pop('exclude_reactions', 'false').lower() == 'true'
+    columns = ['results_pathway']
+    exclude = ['solver_report']
+    if exclude_reactions:
+        exclude.append('results_reaction')
+    else:
+        columns.append('results_reaction')
+
+    analyses = list(Analysis.get_multiple(args.values()).options(
+        *map(undefer, columns)))
+    if len(analyses) != len(args):
         return '', 401
-    X = [i.results_pathway for i in analyses]
-    y = [i.name for i in analyses]
-    return AnalysisSchema(many=True).jsonify(analyses)
+    return AnalysisSchema(many=True, exclude=exclude).jsonify(analyses)
 
 
 @app.route('/analysis/visualization')
@@ -103,12 +312,174 @@ def analysis_visualization():
           type: string
           required: true
     """
-    analyses = list(Analysis.get_multiple(request.args.values()))
-    if len(analyses) != len(request.args):
+    versions = Analysis.get_multiple(request.args.values()).with_entities(
+        Analysis.id, Analysis.name, Analysis.end_time).order_by(
+            Analysis.id).all()
+    if len(versions) != len(request.args):
         return '', 401
-    X = [i.results_pathway[0] for i in analyses]
-    y = [i.name for i in analyses]
-    return jsonify(HeatmapVisualization(X, y).clustered_data())
+
+    key = tuple(tuple(v) for v in versions)
+    clustered_data = heatmap_cache.get(key)
+    if clustered_data is None:
+        results = dict(Analysis.query.filter(
+            Analysis.id.in_([v.id for v in versions])).with_entities(
+                Analysis.id, Analysis.results_pathway))
+        X = [results[v.id][0] for v in versions]
+        y = [v.name for v in versions]
+        clustered_data = HeatmapVisualization(
+            X, y,
+            max_exact=app.config['HEATMAP_MAX_EXACT'],
+            max_pathways=app.config['HEATMAP_MAX_PATHWAYS']).clustered_data()
+        heatmap_cache.set(key, clustered_data)
+    return jsonify(clustered_data)
+
+
+@app.route('/analysis/status/<int:id>')
+def analysis_status(id):
+    """
+    Progress of analysis as solved and total LPs with estimated
+    remaining seconds. If solved is given, request waits up to wait
+    seconds until analysis solves more LPs, gets its preview
+    or finishes (long polling).
+    ---
+    tags:
+      - analysis
+    parameters:
+        -
+          name: authorization
+          in: header
+          type: string
+          required: true
+        -
+          name: id
+          in: path
+          type: integer
+          required: true
+        -
+          name: solved
+          in: query
+          type: integer
+          description: number of solved LPs in last status of client
+        -
+          name: preview
+          in: query
+          type: boolean
+          description: preview in last status of client
+        -
+          name: wait
+          in: query
+          type: number
+          description: seconds to wait for change, at most 10 by default
+    responses:
+      200:
+        description: Analysis status
+      404:
+        description: Analysis not found
+      401:
+        description: Analysis is not yours
+    """
+    row = status_row(id)
+    if not row:
+        return '', 404
+    if not Analysis.authorized(row.type, row.user_id):
+        return '', 401
+
+    try:
+        solved = request.args.get('solved', type=int)
+        preview = request.args.get('preview', 'false').lower() == 'true'
+        wait = min(float(request.args.get('wait', 0) or 0),
+                   app.config['STATUS_POLL_TIMEOUT'])
+    except ValueError:
+        return jsonify({'wait': ['Not a valid number.']}), 400
+
+    deadline = time.time() + wait
+    status = progress_status(id, row)
+    while solved is not None and status['solved'] == solved and \
+            status['preview'] == preview and not status['status'] and \
+            not status['failed'] and \
+            time.time() < deadline:
+        # releases connection while waiting for next poll
+        db.session.close()
+        time.sleep(app.config['STATUS_POLL_INTERVAL'])
+        row = status_row(id)
+        if not row:
+            return '', 404
+        status = progress_status(id, row)
+    return jsonify(status)
+
+
+def status_row(id):
+    return Analysis.query.filter_by(id=id).with_entities(
+        Analysis.type, Analysis.user_id, Analysis.status,
+        Analysis.preview, Analysis.sample_count, Analysis.completed_samples,
+        Analysis.start_time, Analysis.end_time).first()
+
+
+def progress_status(id, row):
+    sample_count = row.sample_count or 1
+    status = {
+        'id': id,
+        'status': bool(row.status),
+        'failed': not row.status and row.end_time is not None,
+        'preview': bool(row.preview),
+        'sample_count': sample_count,
+        'completed_samples': row.completed_samples or 0,
+        'start_time': row.start_time and row.start_time.isoformat(),
+        'end_time': row.end_time and row.end_time.isoformat()
+    }
+    if row.status:
+        status.update({'solved': None, 'total': None, 'eta': 0})
+    else:
+        status.update(summarize_progress(
+            read_progress(id, sample_count), sample_count))
+    return status
+
+
+@app.route('/analysis/queues')
+def analysis_queues():
+    """
+    Number of tasks waiting in broker for each queue, number of running
+    or waiting analyses routed to it and mean and longest seconds they
+    have waited since submission
+    ---
+    tags:
+        - analysis
+    """
+    queues = {
+        q: {'depth': broker_queue_length(q), 'pending': 0,
+            'mean_wait': None, 'oldest_wait': None}
+        for q in app.config['ANALYSIS_QUEUE_PRIORITIES']
+    }
+    wait = extract('epoch', datetime.datetime.now() - Analysis.start_time)
+    rows = Analysis.query.filter_pending().filter(
+        Analysis.queue != None).with_entities(
+            Analysis.queue, func.count(Analysis.id), func.avg(wait),
+            func.max(wait)).group_by(Analysis.queue)
+    for (queue, pending, mean_wait, oldest_wait) in rows:
+        if queue in queues:
+            queues[queue].update({
+                'pending': pending,
+                'mean_wait': float(mean_wait)
+                if mean_wait is not None else None,
+                'oldest_wait': float(oldest_wait)
+                if oldest_wait is not None else None
+            })
+    return jsonify(queues)
+
+
+def broker_queue_length(queue):
+    '''
+    Number of messages waiting in queue of broker over all priorities,
+    None if broker can not be reached
+    '''
+    try:
+        with celery.connection_or_acquire() as connection:
+            # declaring is idempotent and does not fail for empty queues
+            return connection.default_channel.queue_declare(
+                queue).message_count
+    except Exception as e:
+        logger.warning('length of queue %s is not read: %s' % (queue, e))
+        return None
 
 
 @app.route('/analysis/<type>')
@@ -125,12 +496,47 @@ def disease_analysis(type: str):
           type: string
           required: true
     """
-    return AnalysisSchema(many=True).jsonify(
-        Analysis.query.filter_by(type=type).with_entities(
-            Analysis.id, Analysis.name, Analysis.status))
+    key = None
+    try:
+        key = ('analysis-list', type, list_generation(type)) + page_args()
+    except ValueError:
+        pass
+    cached = response_cache.get(key) if key else None
+    if cached is None:
+        response = paginated(
+            Analysis.query.filter_by(type=type).with_entities(
+                Analysis.id, Analysis.name, Analysis.status))
+        if isinstance(response, tuple):
+            return response
+        body = response.get_data(as_text=True)
+        cached = (body, response.headers.get('X-Total-Count'),
+                  hashlib.sha1(body.encode('utf-8')).hexdigest())
+        response_cache.set(key, cached)
+
+    (body, total, etag) = cached
+    response = not_modified(etag)
+    if response is None:
+        response = with_validators(
+            Response(body, mimetype='application/json'), etag)
+    if total is not None:
+        response.headers['X-Total-Count'] = total
+    return response
 
 
-@app.route('/analysis/detail/<id>')
+def list_generation(type):
+    '''
+    Token of cached pages of analysis list of type which is
+    renewed by invalidate_analysis
+    '''
+    key = ('analysis-list', type)
+    generation = response_cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        response_cache.set(key, generation)
+    return generation
+
+
+@app.route('/analysis/detail/<int:id>')
 def analysis_detail(id):
     """
     Get analysis detail from id
@@ -155,13 +561,177 @@ def analysis_detail(id):
         description: Analysis not found
       401:
         description: Analysis is not yours
+      304:
+        description: Analysis is not modified
+    """
+    key = ('analysis-detail', id)
+    cached = response_cache.get(key)
+    if cached is not None:
+        if not Analysis.authorized(cached['type'], cached['user_id']):
+            return '', 401
+        response = not_modified(cached['etag'], cached['end_time'])
+        if response:
+            return response
+
+    analysis = Analysis.query.get(id)
+    if not analysis:
+        return '', 404
+    if not analysis.authenticated():
+        return '', 401
+
+    fields = AnalysisSchema(exclude=(
+        'results_pathway', 'results_reaction')).dump(analysis).data
+    chunks = object_chunks(fields, [
+        (k, json_chunks(load_results(analysis, getattr(Analysis, k))))
+        for k in ['results_pathway', 'results_reaction']
+    ])
+    if not analysis.status:
+        return streamed_response(chunks, 'application/json')
+
+    # only validators are cached, results are streamed from db
+    if cached is None:
+        cached = {
+            'type': analysis.type,
+            'user_id': analysis.user_id,
+            'end_time': analysis.end_time,
+            'etag': hashlib.sha1(json.dumps(
+                fields, sort_keys=True).encode('utf-8')).hexdigest()
+        }
+        response_cache.set(key, cached)
+        response = not_modified(cached['etag'], cached['end_time'])
+        if response:
+            return response
+    return with_validators(streamed_response(chunks, 'application/json'),
+                           cached['etag'], cached['end_time'])
+
+
+@app.route('/analysis/detail/<id>/<kind>')
+def analysis_results(id, kind):
+    """
+    Get reaction or pathway results of analysis
+    ---
+    tags:
+      - analysis
+    parameters:
+        -
+          name: authorization
+          in: header
+          type: string
+          required: true
+        -
+          name: id
+          in: path
+          type: integer
+          required: true
+        -
+          name: kind
+          in: path
+          type: string
+          enum: [reaction, pathway]
+          required: true
+        -
+          name: key
+          in: query
+          type: array
+          items:
+            type: string
+          collectionFormat: multi
+          description: reactions or pathways to return, all by default
+        -
+          name: format
+          in: query
+          type: string
+          enum: [json, binary, index]
+          description: binary is little endian float32 matrix of
+            samples x keys ordered by index, which is sorted keys
+            unless key is given. index returns keys with their hash
+            which is sent in X-Result-Index header of binary responses.
+    responses:
+      200:
+        description: Results of analysis
+      404:
+        description: Analysis not found
+      401:
+        description: Analysis is not yours
     """
+    if kind not in ['reaction', 'pathway']:
+        return '', 404
     analysis = Analysis.query.get(id)
     if not analysis:
         return '', 404
     if not analysis.authenticated():
         return '', 401
-    return AnalysisSchema().jsonify(analysis)
+
+    keys = request.args.getlist('key')
+    samples = load_results(analysis, getattr(Analysis, 'results_%s' % kind),
+                           keys) or []
+    result_format = request.args.get('format', 'json')
+
+    if result_format == 'json':
+        return streamed_response(json_chunks(samples), 'application/json')
+
+    index = keys or result_index(samples)
+    if result_format == 'index':
+        return jsonify({'index': index, 'hash': index_hash(index)})
+    elif result_format == 'binary':
+        response = streamed_response(
+            iter([to_binary(samples, index)]), 'application/octet-stream')
+        response.headers['X-Result-Shape'] = '%d,%d' % (len(samples),
+                                                        len(index))
+        response.headers['X-Result-Index'] = index_hash(index)
+        return response
+    return jsonify({'format': ['should be json, binary or index']}), 400
+
+
+def load_results(analysis, column, keys=None):
+    '''
+    Loads result column of analysis. If keys are given,
+    only their values are extracted by json operators in db.
+    '''
+    num_samples = analysis.sample_count or 1
+    if not keys or len(keys) * num_samples > 1000:
+        (samples, ) = db.session.query(column).filter(
+            Analysis.id == analysis.id).one()
+        if keys and samples:
+            samples = [{k: s[k] for k in keys if k in s} for s in samples]
+        return samples
+
+    values = db.session.query(
+        *[column[i][k] for i in range(num_samples) for k in keys]).filter(
+            Analysis.id == analysis.id).one()
+    return [{k: v for k, v in zip(keys, values[i * len(keys):])
+             if v is not None} for i in range(num_samples)]
+
+
+def streamed_response(chunks, mimetype):
+    '''
+    Streams chunks compressed by encoding accepted by client
+    '''
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        chunks = compress(chunks, encoding)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    '''
+    Not modified response if client has current version of resource
+    '''
+    if is_resource_modified(request.environ, etag,
+                            last_modified=last_modified):
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
 
 
 @app.route('/analysis/most-similar-diseases/<id>')
@@ -190,23 +760,84 @@ def most_similar_diseases(id: int):
       401:
         description: Analysis is not yours
     """
-    analysis = Analysis.query.get(id)
+    analysis = Analysis.query.options(undefer('results_pathway')).get(id)
     if not analysis:
         return '', 404
     if not analysis.authenticated():
         return '', 401
 
-    row_disease_analyses = Analysis.query.filter_by(
-        type='disease').with_entities(Analysis.name,
-                                      Analysis.results_pathway).all()
+    index = disease_index.get()
+    top_5 = [(index.attributes['name'][index.rows[k]], sim)
+             for k, sim in index.most_similar(
+                 analysis.results_pathway[0], k=5, metric='correlation')]
 
-    names, disease_analyses = zip(*[(i[0], i[1][0])
-                                    for i in row_disease_analyses])
+    return jsonify(dict(top_5))
 
-    sims = similarty_dict(analysis.results_pathway[0], list(disease_analyses))
-    top_5 = sorted(zip(names, sims), key=lambda x: x[1], reverse=True)[:5]
 
-    return jsonify(dict(top_5))
+@app.route('/analysis/similar/<id>')
+def similar_analyses(id: int):
+    """
+    Finds accessible analyses with most similar pathway profile
+    ---
+    tags:
+      - analysis
+    parameters:
+      -
+        name: authorization
+        in: header
+        type: string
+        required: true
+      -
+        name: id
+        in: path
+        type: integer
+        required: true
+      -
+        name: metric
+        in: query
+        type: string
+        enum: [correlation, cosine]
+      -
+        name: k
+        in: query
+        type: integer
+    responses:
+      200:
+        description: Most similar analyses
+      404:
+        description: Analysis not found
+      401:
+        description: Analysis is not yours
+    """
+    analysis = Analysis.query.options(undefer('results_pathway')).get(id)
+    if not analysis or not analysis.results_pathway:
+        return '', 404
+    if not analysis.authenticated():
+        return '', 401
+
+    metric = request.args.get('metric', 'correlation')
+    if metric not in VectorIndex.metrics:
+        return jsonify({'metric': ['should be one of %s' %
+                                   VectorIndex.metrics]}), 400
+    try:
+        k = min(int(request.args.get('k', 10)), 100)
+    except ValueError:
+        return jsonify({'k': ['Not a valid integer.']}), 400
+
+    index = analysis_index.get()
+    mask = index.mask('type', Analysis.public_types)
+    identity = Analysis.authenticated_identity()
+    if identity:
+        mask |= index.mask('user_id', [identity.id])
+    if analysis.id in index:
+        mask[index.rows[analysis.id]] = False
+
+    return jsonify([{
+        'id': key,
+        'name': index.attributes['name'][index.rows[key]],
+        'similarity': similarity
+    } for key, similarity in index.most_similar(
+        analysis.results_pathway[0], k=k, metric=metric, mask=mask)])
 
 
 @app.route('/analysis/list')
@@ -224,7 +855,7 @@ def user_analysis():
           type: string
           required: true
     """
-    return AnalysisSchema(many=True).jsonify(
+    return paginated(
         current_identity.analysis.filter_by(type='private').with_entities(
             Analysis.id, Analysis.name, Analysis.status))
 
@@ -247,7 +878,46 @@ def search_analysis_by_change():
     if error:
         return jsonify(error), 400
 
-    return AnalysisSchema(many=True).jsonify(
-        Analysis.query.filter_by_change_many(data)
-        .filter_by_change_amount_many(data).filter_by_authentication()
+    return paginated(
+        Analysis.query.filter_by_pathway_changes(data)
+        .filter_by_authentication()
+        .with_entities(Analysis.id, Analysis.name, Analysis.status))
+
+
+@app.route('/analysis/search-by-reaction-change', methods=['POST'])
+def search_analysis_by_reaction_change():
+    """
+    Search analyses by changes of reactions
+    ---
+    tags:
+        - analysis
+    parameters:
+        - in: body
+          name: body
+          schema:
+            type: array
+            items:
+              id: ReactionChanges
+              required:
+                - reaction
+                - change
+              properties:
+                reaction:
+                  type: string
+                change:
+                  type: integer
+                  description: positive for increase, negative for decrease
+                qualifier:
+                  type: string
+                  enum: [lt, gt, eq]
+                amount:
+                  type: number
+    """
+    (data, error) = ReactionChangesScheme().load(request.json, many=True)
+    if error:
+        return jsonify(error), 400
+
+    return paginated(
+        Analysis.query.filter_by_reaction_changes(data)
+        .filter_by_authentication()
         .with_entities(Analysis.id, Analysis.name, Analysis.status))
@@ -1,18 +1,37 @@
-from flask import jsonify, request
+import json
+import hashlib
+from functools import lru_cache
+
+from flask import jsonify, request, Response
+from werkzeug.http import is_resource_modified
 from flask_swagger import swagger
 from flask_jwt import jwt_required, current_identity
 
 from ..app import app
 from ..schemas import *
 from ..models import db, User, Analysis
+from ..auth import invalidate_identity
 
 
 @app.route("/spec")
 def spec():
+    (body, etag) = spec_document()
+    response = Response(status=304) if not is_resource_modified(
+        request.environ, etag) else Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+@lru_cache(maxsize=1)
+def spec_document():
+    '''
+    Swagger document of api which is generated once since routes are static
+    '''
     swag = swagger(app)
     swag['info']['version'] = "1.0"
     swag['info']['title'] = "Metabolitics API"
-    return jsonify(swag)
+    body = json.dumps(swag, sort_keys=True)
+    return (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
 
 
 @app.route('/auth/sign-up', methods=['POST'])
@@ -117,6 +136,7 @@ def auth_update():
     current_identity.email = data.email
     current_identity.affiliation = data.affiliation
     db.session.commit()
+    invalidate_identity(current_identity.id)
     return ''
 
 
@@ -159,4 +179,5 @@ def auth_change_password():
         return '', 401
     current_identity.password = data['new_password']
     db.session.commit()
+    invalidate_identity(current_identity.id)
     return ''
@@ -0,0 +1,159 @@
+import os
+import fcntl
+import pickle
+import hashlib
+import logging
+import threading
+
+from celery.signals import worker_process_init
+
+from analysis import Presolve
+from preprocessing import DynamicPreprocessing
+from .app import app, celery
+from .cache import LRUCache
+
+logger = logging.getLogger('api')
+
+
+class ModelCache:
+    '''
+    Keeps analysis models loaded once per worker process.
+    Reaction scaler is reloaded when mtime of pickled model changes.
+    '''
+
+    def __init__(self, path, version=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reaction_scaler = None
+        self._mtime = None
+        self._pathway_scaler = None
+        self.configured_version = version
+        self._version = None
+        self._version_mtime = None
+        self._published_mtime = None
+        self._presolve = None
+        self.presolve_path = '%s.presolve' % path
+        self._published = LRUCache(1, ttl=60)
+
+    def reaction_scaler(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    logger.info('loading reaction scaler from %s' % self.path)
+                    with open(self.path, 'rb') as f:
+                        self._reaction_scaler = pickle.load(f)
+                    self._mtime = mtime
+                    self._presolve = None
+        # web processes fingerprint analyses by published version,
+        # so it is published again until it succeeds after each reload
+        if mtime != self._published_mtime and self.publish_version():
+            self._published_mtime = mtime
+        return self._reaction_scaler
+
+    def pathway_scaler(self):
+        if self._pathway_scaler is None:
+            with self._lock:
+                if self._pathway_scaler is None:
+                    self._pathway_scaler = DynamicPreprocessing(
+                        ['pathway-scoring', 'transport-elimination'])
+        return self._pathway_scaler
+
+    def fva_scaler(self):
+        return self.reaction_scaler().named_steps['fva']
+
+    def presolve(self):
+        '''
+        Presolve of reaction model which is loaded from presolve_path
+        or computed and saved there if it is missing or computed from
+        other model file, even if version of model is configured.
+        It is computed by one process at a time while others wait for it,
+        presolve-model command computes it before workers start.
+        '''
+        version = self.digest()
+        if self._presolve is None or not self._presolve.is_current(version):
+            with self._lock, open('%s.lock' % self.presolve_path, 'w') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    presolve = None
+                    if os.path.exists(self.presolve_path):
+                        presolve = Presolve.load(self.presolve_path)
+                    if presolve is None or not presolve.is_current(version):
+                        logger.info('computing presolve of %s' % self.path)
+                        presolve = Presolve.compute(
+                            self.fva_scaler().analyzer.copy(),
+                            version=version)
+                        presolve.save(self.presolve_path)
+                    self._presolve = presolve
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return self._presolve
+
+    def version(self):
+        '''
+        Version of reaction model which is configured one
+        or md5 of model file
+        '''
+        return self.configured_version or self.digest()
+
+    def digest(self):
+        '''
+        md5 of model file which is recomputed when its mtime changes
+        '''
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._version_mtime:
+            md5 = hashlib.md5()
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    md5.update(chunk)
+            (self._version, self._version_mtime) = (md5.hexdigest(), mtime)
+        return self._version
+
+    version_key = 'api-model-version'
+
+    def publish_version(self):
+        '''
+        Writes version of reaction model into result backend
+        for web processes which do not have the model file,
+        returns whether it is written
+        '''
+        try:
+            celery.backend.set(self.version_key, self.version())
+        except Exception as e:
+            logger.warning('model version is not published: %s' % e)
+            return False
+        return True
+
+    def published_version(self):
+        '''
+        Configured version or one published by workers,
+        None if it is not known
+        '''
+        if self.configured_version:
+            return self.configured_version
+        version = self._published.get('version')
+        if version is None:
+            try:
+                version = celery.backend.get(self.version_key)
+            except Exception as e:
+                logger.warning('model version is not read: %s' % e)
+                return None
+            if version is None:
+                return None
+            if isinstance(version, bytes):
+                version = version.decode('utf-8')
+            self._published.set('version', version)
+        return version
+
+    def load(self):
+        self.reaction_scaler()
+        self.pathway_scaler()
+
+
+model_cache = ModelCache(app.config['API_MODEL_PATH'],
+                         app.config['API_MODEL_VERSION'])
+
+
+@worker_process_init.connect
+def load_models(**kwargs):
+    model_cache.load()
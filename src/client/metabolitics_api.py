@@ -22,6 +22,23 @@ class MetaboliticsApiClient:
         req.raise_for_status()
         return req.json()['id']
 
+    def analyze_many(self, analyses, public=True, queue='bulk'):
+        '''
+        Submits dict of name to concentration changes in one request
+        into bulk or disease queue and returns ids in order of items
+        '''
+        req = requests.post(
+            self.url % 'analysis/fva/batch',
+            params={'queue': queue},
+            json=[{
+                'name': name,
+                'public': public,
+                'concentration_changes': concentration_changes
+            } for name, concentration_changes in analyses.items()],
+            headers=self.auth_header)
+        req.raise_for_status()
+        return req.json()['ids']
+
     @property
     def auth_header(self):
         return {'Authorization': 'JWT %s' % self.token_}
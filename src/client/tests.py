@@ -12,5 +12,8 @@ class TestMetaboliticsApiClient:
     def test_analyze(self, name, concentration_changes):
         pass
 
+    def test_analyze_many(self, analyses):
+        pass
+
     def test_get_analysis(self, id):
         pass
@@ -33,6 +33,25 @@ class MetabolicAdjMatrix:
         coos = (np.ones(len(adj_list)), (i_indices, j_indices))
         return coo_matrix(coos, shape=(num_of_nodes, num_of_nodes))
 
+    def _reaction_adj_list(self):
+        '''
+        Pairs of reactions which share a metabolite which is not currency
+        '''
+        indexes = {r.id: i for i, r in enumerate(self.model.reactions)}
+        adj_list = set()
+        for m in self.model.metabolites:
+            if m.is_currency():
+                continue
+            reactions = [indexes[r.id] for r in m.reactions]
+            for i in range(len(reactions)):
+                for j in range(i + 1, len(reactions)):
+                    adj_list.add((reactions[i], reactions[j]))
+        return (list(adj_list), len(indexes))
+
+    def to_reaction_adj_matrix(self):
+        (adj_list, num_of_nodes) = self._reaction_adj_list()
+        return self._adj_list_to_adj_matrix(adj_list, num_of_nodes)
+
     def to_subsystem_adj_matrix(self):
         (adj_list, num_of_nodes) = self._border_sub_adj_list()
         return self._adj_list_to_adj_matrix(adj_list, num_of_nodes)
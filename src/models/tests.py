@@ -2,6 +2,7 @@ import unittest
 
 import cobra as cb
 import cobra.test
+from scipy.sparse import csgraph
 from .metabolite_extantions import *
 from .metabolic_adj_matrix import MetabolicAdjMatrix
 import math
@@ -82,3 +83,11 @@ class TestMetabolicAdjMatrix(unittest.TestCase):
 
         (num_comp, labels) = self.unconnected_adj.is_subsystem_level_connected_component()
         self.assertEqual(num_comp, 2)
+
+    def test_to_reaction_adj_matrix(self):
+        adj_matrix = self.adj.to_reaction_adj_matrix()
+        num_reactions = len(self.adj.model.reactions)
+        self.assertEqual(adj_matrix.shape, (num_reactions, num_reactions))
+        (num_comp, labels) = csgraph.connected_components(
+            adj_matrix, directed=False)
+        self.assertEqual(num_comp, 1)
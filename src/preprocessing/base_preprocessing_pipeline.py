@@ -21,5 +21,9 @@ class BasePreprocessingPipeline(object):
         '''
         return self._pipe.fit_transform(X, y)
 
+    @property
+    def named_steps(self):
+        return self._pipe.named_steps
+
     def __str__(self):
         return str(self._model)
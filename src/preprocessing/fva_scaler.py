@@ -1,7 +1,7 @@
 import logging
 import json
-import time
 import uuid
+from contextlib import contextmanager
 
 from joblib import Parallel, delayed
 from sklearn.base import TransformerMixin
@@ -23,28 +23,80 @@ class FVAScaler(TransformerMixin):
         self.analyzer = BaseFVA.create_for(dataset_name)
         self.filter_by_subsystem = filter_by_subsystem
         self.vectorizer = vectorizer
+        self.options = dict()
+        self.reports = list()
+        self.approximate = False
+
+    @contextmanager
+    def configured(self, **options):
+        '''
+        Passes options to fva of samples transformed in context
+        and collects solver reports of them into reports.
+        progress option is only used for single sample.
+        '''
+        self.options = options
+        self.reports = list()
+        try:
+            yield self
+        finally:
+            self.options = dict()
+
+    @contextmanager
+    def approximating(self):
+        '''
+        Approximates fva ranges of samples transformed in context
+        by fba flux which is min and max of reaction
+        '''
+        self.approximate = True
+        try:
+            yield self
+        finally:
+            self.approximate = False
 
     def fit(self, X, y):
         return self
 
     def transform(self, X, y=None):
-        return Parallel(n_jobs=-1)(
-            delayed(self._sample_transformation)(i)
-            for i in self.vectorizer.inverse_transform(X))
+        X = self.vectorizer.inverse_transform(X)
+        if getattr(self, 'approximate', False):
+            return [self._fba_transformation(x) for x in X]
+        options = getattr(self, 'options', dict())
+        if len(X) == 1:
+            # avoids pickling analyzer into a worker process for single sample
+            samples = [self._analyze_sample(X[0], options)]
+        else:
+            options = {k: v for k, v in options.items() if k != 'progress'}
+            samples = Parallel(n_jobs=-1)(
+                delayed(self._analyze_sample)(i, options) for i in X)
+        self.reports = [report for (_, report) in samples]
+        return [x for (x, _) in samples]
+
+    def _sample_transformation(self, x, progress=None):
+        (nex_x, _) = self._analyze_sample(x, {'progress': progress})
+        return nex_x
 
-    def _sample_transformation(self, x):
-        t = time.time()
+    def _analyze_sample(self, x, options):
+        '''
+        Min and max flux of reactions of sample with solver report of fva
+        '''
         guid = uuid.uuid4()
-        fva_scaler_logger.info('%s started data: %s' % (str(guid),
-                                                        json.dumps(x)))
+        logger.info('%s started data: %s' % (str(guid), json.dumps(x)))
         nex_x = dict()
         analyzer = self.analyzer.copy()
-        for r in analyzer.analyze(
-            x, filter_by_subsystem=self.filter_by_subsystem) \
-                .data_frame.itertuples():
+        results = analyzer.analyze(
+            x, filter_by_subsystem=self.filter_by_subsystem, **options)
+        for r in results.data_frame.itertuples():
             nex_x['%s_max' % r.Index] = r.upper_bound
             nex_x['%s_min' % r.Index] = r.lower_bound
-        fva_scaler_logger.info('%s ended' % str(guid))
+        logger.info('%s ended' % str(guid))
+        return (nex_x, results.solver_report)
+
+    def _fba_transformation(self, x):
+        analyzer = self.analyzer.copy()
+        nex_x = dict()
+        for reaction_id, flux in analyzer.fba(x).fluxes.items():
+            nex_x['%s_max' % reaction_id] = flux
+            nex_x['%s_min' % reaction_id] = flux
         return nex_x
 
     def fit_transform(self, X, y):
@@ -8,7 +8,8 @@ class PathwayFvaScaler(TransformerMixin):
 
     def __init__(self, dataset_name="recon2"):
         super().__init__()
-        self.model = DataReader.read_network_model(dataset_name)
+        model = DataReader.read_network_model(dataset_name)
+        self.reaction_subsystems = {r.id: r.subsystem for r in model.reactions}
 
     def fit(self, X, y=None):
         return self
@@ -19,10 +20,10 @@ class PathwayFvaScaler(TransformerMixin):
             sub_flux = defaultdict(int)
             sub_count = defaultdict(int)
             for reaction_id, flux in x.items():
-                reaction = self.model.reactions.get_by_id(reaction_id[:-4])
+                subsystem = self.reaction_subsystems[reaction_id[:-4]]
                 min_max = reaction_id[-3:]
-                sub_flux['%s_%s' % (reaction.subsystem, min_max)] += flux
-                sub_count['%s_%s' % (reaction.subsystem, min_max)] += 1
+                sub_flux['%s_%s' % (subsystem, min_max)] += flux
+                sub_count['%s_%s' % (subsystem, min_max)] += 1
             if metrics == 'mean':
                 subsystem_scores.append({
                     s: sub_flux[s] / sub_count[s] for s in sub_flux
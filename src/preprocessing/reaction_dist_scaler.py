@@ -9,46 +9,60 @@ class ReactionDiffScaler(TransformerMixin):
 
     def __init__(self, dataset_name="recon2"):
         super().__init__()
-        self.model = DataReader.read_network_model(dataset_name)
+        model = DataReader.read_network_model(dataset_name)
+        self.reaction_ids = [r.id for r in model.reactions]
+
+    def __setstate__(self, state):
+        '''
+        Slims scalers pickled with whole network model into reaction ids
+        '''
+        if 'reaction_ids' not in state:
+            state['reaction_ids'] = [r.id for r in state['model'].reactions]
+        state.pop('model', None)
+        self.__dict__.update(state)
 
     def fit(self, X, y=None):
         self.healthy_flux = average_by_label(X, y, 'h')
         return self
 
     def transform(self, X, y=None):
+        '''
+        Reactions which are not solved by fva in x are skipped
+        '''
         return [{
-            '%s_dif' % reaction.id: self._reaction_flux_dis(reaction, x)
-            for reaction in self.model.reactions
+            '%s_dif' % reaction_id: self._reaction_flux_dis(reaction_id, x)
+            for reaction_id in self.reaction_ids
+            if '%s_max' % reaction_id in x
         } for x in X]
 
-    def _reaction_flux_dis(self, reaction, x):
-        r_min = x['%s_min' % reaction.id]
-        r_max = x['%s_max' % reaction.id]
+    def _reaction_flux_dis(self, reaction_id, x):
+        r_min = x['%s_min' % reaction_id]
+        r_max = x['%s_max' % reaction_id]
 
-        hf_min = self.healthy_flux['%s_min' % reaction.id]
-        hf_max = self.healthy_flux['%s_max' % reaction.id]
+        hf_min = self.healthy_flux['%s_min' % reaction_id]
+        hf_max = self.healthy_flux['%s_max' % reaction_id]
 
         max_diff = r_max - hf_max
         min_diff = r_min - hf_min
 
         return max_diff + min_diff
 
-    def _reaction_flux_dis0(self, reaction, x):
-        r_min = x['%s_min' % reaction.id]
-        r_max = x['%s_max' % reaction.id]
-        hf_min = self.healthy_flux['%s_min' % reaction.id]
-        hf_max = self.healthy_flux['%s_max' % reaction.id]
+    def _reaction_flux_dis0(self, reaction_id, x):
+        r_min = x['%s_min' % reaction_id]
+        r_max = x['%s_max' % reaction_id]
+        hf_min = self.healthy_flux['%s_min' % reaction_id]
+        hf_max = self.healthy_flux['%s_max' % reaction_id]
 
         return {
-            '%s_min' % reaction.id: r_min - hf_min,
-            '%s_max' % reaction.id: r_max - hf_max
+            '%s_min' % reaction_id: r_min - hf_min,
+            '%s_max' % reaction_id: r_max - hf_max
         }
 
-    def _reaction_flux_dis1(self, reaction, x):
-        r_min = x['%s_min' % reaction.id]
-        r_max = x['%s_max' % reaction.id]
-        hf_min = self.healthy_flux['%s_min' % reaction.id]
-        hf_max = self.healthy_flux['%s_max' % reaction.id]
+    def _reaction_flux_dis1(self, reaction_id, x):
+        r_min = x['%s_min' % reaction_id]
+        r_max = x['%s_max' % reaction_id]
+        hf_min = self.healthy_flux['%s_min' % reaction_id]
+        hf_max = self.healthy_flux['%s_max' % reaction_id]
 
         if (hf_min, hf_max) == (r_min, r_max):
             return 0
@@ -57,11 +71,11 @@ class ReactionDiffScaler(TransformerMixin):
             return 1000 * (
                 abs(hf_min - r_min) + abs(hf_max - r_max)) / interval_len
 
-    def _reaction_flux_dis_1_1(self, reaction, x):
-        r_min = x['%s_min' % reaction.id]
-        r_max = x['%s_max' % reaction.id]
-        hf_min = self.healthy_flux['%s_min' % reaction.id]
-        hf_max = self.healthy_flux['%s_max' % reaction.id]
+    def _reaction_flux_dis_1_1(self, reaction_id, x):
+        r_min = x['%s_min' % reaction_id]
+        r_max = x['%s_max' % reaction_id]
+        hf_min = self.healthy_flux['%s_min' % reaction_id]
+        hf_max = self.healthy_flux['%s_max' % reaction_id]
 
         if (hf_min, hf_max) == (r_min, r_max):
             return 1 * 1000
@@ -57,6 +57,14 @@ class TestFVAScaler(unittest.TestCase):
         X = self.scaler._sample_transformation(X[0])
         assert_min_max_defined(self, X)
 
+    def test_transform_approximating(self):
+        with self.scaler.approximating():
+            X = self.scaler.transform([self.measured_metabolites])
+        self.assertFalse(self.scaler.approximate)
+        assert_min_max_defined(self, X[0])
+        for k, v in X[0].items():
+            self.assertEqual(v, X[0]['%s_min' % k[:-4]])
+
 
 class TestFVARangedMeasurement(unittest.TestCase):
     def setUp(self):
@@ -126,6 +134,11 @@ class TestReactionDiffScaler(unittest.TestCase):
         sub_scores = self.scaler.fit_transform(self.X, self.y)
         self.assertTrue(sub_scores, [{'TAXOLte_dif': 0}, {'TAXOLte_dif': 1}])
 
+    def test_transform_skips_unsolved(self):
+        self.scaler.fit(self.X, self.y)
+        scores = self.scaler.transform([{'TAXOLte_max': 2, 'TAXOLte_min': 1}])
+        self.assertEqual(scores, [{'TAXOLte_dif': 3}])
+
 
 class TestInverseDictVectorizer(unittest.TestCase):
     def setUp(self):
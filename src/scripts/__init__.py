@@ -9,6 +9,7 @@ from .solution_config_generator import solution_config_generator
 from .visualizations import *
 from .disease import *
 from .best_feature_elimination import *
+from .knockout_screen import knockout_screen
 
 try:
     from .pathifier import pathifier
@@ -13,7 +13,10 @@ from sklearn.pipeline import Pipeline
 
 from api import app
 from .cli import cli
-from api.models import db
+from api.models import db, Analysis, AnalysisPathwayScore, \
+    AnalysisReactionScore
+from api.similarity import disease_index, analysis_index
+from api.worker import model_cache
 from services import DataReader, DataWriter
 
 
@@ -27,8 +30,15 @@ def run_api():
 
 
 @cli.command()
-def run_celery():
-    call('celery -A api.celery worker')
+@click.option('--queues', default='interactive,preview,bulk,disease',
+              help='Queues consumed in order of priority, '
+              'run a worker of preview queue alone for fast previews')
+@click.option('--concurrency', default=None, type=int)
+def run_celery(queues, concurrency):
+    command = ['celery', '-A', 'api.celery', 'worker', '-Q', queues]
+    if concurrency:
+        command += ['--concurrency', str(concurrency)]
+    call(command)
 
 
 @cli.command()
@@ -36,6 +46,33 @@ def migrate():
     db.create_all()
 
 
+@cli.command()
+def migrate_scores():
+    analyses = Analysis.query.filter(Analysis.status == True).with_entities(
+        Analysis.id)
+    for (analysis_id, ) in analyses.all():
+        analysis = Analysis.query.get(analysis_id)
+        AnalysisPathwayScore.store(analysis)
+        AnalysisReactionScore.store(analysis)
+        db.session.commit()
+
+
+@cli.command()
+def build_similarity_index():
+    '''
+    Rebuilds similarity indexes of all processes from db
+    '''
+    for index in [disease_index, analysis_index]:
+        index.reset()
+
+
+@cli.command()
+def presolve_model():
+    presolve = model_cache.presolve()
+    print('%d blocked and %d coupled reactions' %
+          (len(presolve.blocked), len(presolve.coupling)))
+
+
 @cli.command()
 def generate_secret():
     with open('../secret.txt', 'w') as f:
@@ -57,7 +57,8 @@ def hmdb_disease_analysis_on_server():
     client = MetaboliticsApiClient()
     client.login('email', 'password')
 
-    hmdb_data = DataReader().read_hmdb_diseases()
+    hmdb_data = list(DataReader().read_hmdb_diseases().items())
 
-    for name, measurements in hmdb_data.items():
-        print(client.analyze(name, measurements))
+    for i in range(0, len(hmdb_data), 100):
+        print(client.analyze_many(
+            dict(hmdb_data[i:i + 100]), queue='disease'))
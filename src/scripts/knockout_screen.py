@@ -0,0 +1,28 @@
+import json
+
+import click
+
+from analysis import BaseFVA, KnockoutScreen
+from .cli import cli
+
+
+@cli.command()
+@click.argument('measurements', type=click.File())
+@click.option('--model', default='recon2')
+@click.option('--method', type=click.Choice(KnockoutScreen.methods),
+              default='fba')
+@click.option('--level', type=click.Choice(KnockoutScreen.levels),
+              default='subsystem')
+@click.option('--n-jobs', default=-1)
+@click.option('--output', default='../outputs/knockout_screen.csv')
+def knockout_screen(measurements, model, method, level, n_jobs, output):
+    '''
+    Screens pathway scores of measurement profile in json file
+    under knockout of each subsystem or reaction of model
+    '''
+    screen = KnockoutScreen(BaseFVA.create_for(model), json.load(measurements),
+                            method=method, level=level, n_jobs=n_jobs)
+    df = screen.screen()
+    df.to_csv(output)
+    print('%d knockouts, %d infeasible' %
+          (len(df), df.isnull().all(axis=1).sum()))
@@ -3,13 +3,16 @@ from subprocess import call
 from .cli import cli
 from analysis import BaseFVA
 from cameo.exceptions import SolveError
+from joblib import Parallel, delayed, cpu_count
+import click
 import datetime
 
 total = 0
 feasible = 0
 
 @cli.command()
-def solution_config_generator():
+@click.option('--n-jobs', default=1, help='parallel workers of candidates')
+def solution_config_generator(n_jobs):
     #model = DataReader().read_network_model()
     model = BaseFVA.create_for()
 
@@ -24,7 +27,8 @@ def solution_config_generator():
         if category.startswith('glycan'):
             print(category, len(subsystems))
             print(subsystems)
-            generate_category_config(model, subsystems, configurations)
+            generate_category_config(model, subsystems, configurations,
+                                     n_jobs)
             break
     print(total, feasible)
     end = datetime.datetime.now()
@@ -32,36 +36,35 @@ def solution_config_generator():
     print('the number of valid configurations:', len(configurations))
     print(delta)
 
-def generate_category_config(model, subsystems, configurations):
+def generate_category_config(model, subsystems, configurations, n_jobs=1):
     iteration_i_res = []
     iteration_i_plus_1_res = []
 
     # prepare lenght-1 list
-    i = 1
-    for subsys in subsystems:
-        s = [subsys]
-        if has_feasible_sol(model, s, subsystems, configurations):
-            iteration_i_res.append(s)
-        i += 1
+    iteration_i_res = evaluate_candidates(
+        model, [[subsys] for subsys in subsystems], subsystems,
+        configurations, n_jobs)
     print('Seed:', len(iteration_i_res))
 
     while len(iteration_i_res) > 1:
         i = 0
         print(iteration_i_res)
-        iteration_i_plus_1_res = []
+        candidates = []
         start = datetime.datetime.now()
         while i < len(iteration_i_res):
             j = i+1
             while j < len(iteration_i_res):
                 merged_pair = merge(iteration_i_res[i], iteration_i_res[j])
                 if merged_pair != None:
-                    if has_feasible_sol(model, merged_pair, subsystems, configurations):
-                        iteration_i_plus_1_res.append(merged_pair)
+                    candidates.append(merged_pair)
                 j += 1
             i += 1
+        iteration_i_plus_1_res = evaluate_candidates(
+            model, candidates, subsystems, configurations, n_jobs)
         iteration_i_res = iteration_i_plus_1_res
         end = datetime.datetime.now()
-        print('iteration:', len(iteration_i_res[0]), len(iteration_i_res), end-start)
+        print('iteration:', len(candidates[0]) if candidates else 0,
+              len(iteration_i_res), end-start)
     print(iteration_i_plus_1_res)
 
 def merge(subsys_set1, subsys_set2):
@@ -72,32 +75,70 @@ def merge(subsys_set1, subsys_set2):
     return subsys_set1 + subsys_set2[-1:]
 
 def has_feasible_sol(model, active_subsystems, all_subsystems, configurations):
+    return bool(evaluate_candidates(
+        model, [active_subsystems], all_subsystems, configurations))
+
+
+def evaluate_candidates(model, candidates, all_subsystems, configurations,
+                        n_jobs=1):
+    '''
+    Feasible candidates among subsystem combinations. Candidates which are
+    feasible while other subsystems are inactive are added to
+    configurations. Batches of candidates are evaluated in parallel,
+    each on one model whose changes are rolled back after each candidate.
+    '''
     global total, feasible
 
+    n_jobs = cpu_count() if n_jobs < 0 else n_jobs
+    if n_jobs > 1 and len(candidates) > 1:
+        size = -(-len(candidates) // n_jobs)
+        results = [
+            r for batch in Parallel(n_jobs=n_jobs)(
+                delayed(evaluate_batch)(
+                    model, candidates[i:i + size], all_subsystems)
+                for i in range(0, len(candidates), size))
+            for r in batch
+        ]
+    else:
+        results = evaluate_batch(model, candidates, all_subsystems)
+
+    accepted = []
+    for candidate, (status, lps) in zip(candidates, results):
+        total += lps
+        if status is None:
+            continue
+        feasible += 1
+        accepted.append(candidate)
+        if status == 'configuration':
+            configurations.append(candidate)
+    return accepted
+
+
+def evaluate_batch(model, candidates, all_subsystems):
+    return [evaluate_candidate(model, c, all_subsystems) for c in candidates]
+
+
+def evaluate_candidate(model, active_subsystems, all_subsystems):
+    '''
+    Returns 'configuration' if active subsystems are feasible while other
+    subsystems are inactive, 'feasible' if they are feasible otherwise
+    or None, and number of solved LPs
+    '''
     for i in range(2):
-        total += 1
-        model_copy = model.copy()
-        if i == 0 and all_subsystems != None:
-            inactive_subsystems = []
-            for sub in all_subsystems:
-                if sub in active_subsystems:
-                    continue
-                inactive_subsystems.append(sub)
-            model_copy.make_pathways_inactive(inactive_subsystems)
-
-        model_copy.activate_pathways(active_subsystems)
-        try:
-            df = model_copy.fba(measured_metabolites=None, add_constraints=False, filter_by_subsystem=False)
-        except SolveError:
-            if i == 1:
-                return False
-            else:
+        with model.rollback():
+            if i == 0 and all_subsystems != None:
+                inactive_subsystems = []
+                for sub in all_subsystems:
+                    if sub in active_subsystems:
+                        continue
+                    inactive_subsystems.append(sub)
+                model.make_pathways_inactive(inactive_subsystems)
+
+            model.activate_pathways(active_subsystems)
+            try:
+                model.fba(measured_metabolites=None, add_constraints=False,
+                          filter_by_subsystem=False)
+            except SolveError:
                 continue
-        else:
-            if i == 0:
-                configurations.append(active_subsystems)
-
-            feasible += 1
-            return True
-
-
+        return ('configuration' if i == 0 else 'feasible', i + 1)
+    return (None, 2)
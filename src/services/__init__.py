@@ -1,4 +1,5 @@
 from .data_reader import DataReader
 from .data_writer import DataWriter
 from .naming_service import NamingService
+from .vector_index import VectorIndex
 from .data_utils import *
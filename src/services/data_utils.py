@@ -1,4 +1,6 @@
 """Utils for common data operations"""
+import json
+import hashlib
 from typing import Dict, List
 from collections import defaultdict
 
@@ -22,3 +24,21 @@ def similarty_dict(x: Dict, y: List[Dict], metric=correlation):
     """Calculate dictance of one vector in dict format to other dictinary in list of dict"""
     vecs = pd.DataFrame([x] + y).fillna(0).values
     return [1 - metric(vecs[0], v) for v in vecs[1:]]
+
+
+def measurement_fingerprint(measurements, version='', naming=None,
+                            decimals=3, options=None):
+    """
+    Canonical hash of measurements of one sample or list of samples.
+    Options which change results such as fva budget are also hashed.
+    """
+    samples = [measurements] if isinstance(measurements, dict) \
+        else measurements
+    canonical = [{(naming.to(k) if naming else None) or k:
+                  round(float(v), decimals)
+                  for k, v in sample.items()} for sample in samples]
+    payload = [version, canonical]
+    if options:
+        payload.append({k: v for k, v in options.items() if v is not None})
+    payload = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
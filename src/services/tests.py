@@ -1,11 +1,13 @@
 import unittest
 
 import numpy.testing as npt
+from scipy.spatial import distance
 from scipy.spatial.distance import euclidean
 
 from .naming_service import NamingService
 from .data_reader import DataReader
 from .data_utils import *
+from .vector_index import VectorIndex
 
 
 class TestNamingService(unittest.TestCase):
@@ -79,3 +81,68 @@ class TestDataUtils(unittest.TestCase):
 
         return npt.assert_almost_equal(
             similarty_dict(x, y, euclidean), [-0.4142136, -1.4494897])
+
+    def test_measurement_fingerprint(self):
+        x = {'a': 1.00001, 'b': 2}
+        fingerprint = measurement_fingerprint(x, 'v1')
+
+        self.assertEqual(
+            fingerprint, measurement_fingerprint({'b': 2.0, 'a': 1}, 'v1'))
+        self.assertEqual(fingerprint, measurement_fingerprint([x], 'v1'))
+        self.assertEqual(fingerprint, measurement_fingerprint(
+            x, 'v1', options={'budget': None}))
+        self.assertNotEqual(fingerprint, measurement_fingerprint(
+            x, 'v1', options={'budget': 60}))
+        self.assertNotEqual(fingerprint, measurement_fingerprint(x, 'v2'))
+        self.assertNotEqual(
+            fingerprint, measurement_fingerprint({'a': 1.1, 'b': 2}, 'v1'))
+
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.y = [{'b': 2, 'a': 2, 'c': 1}, {'b': 0, 'a': 2, 'd': 1},
+                  {'a': -1, 'b': 3}]
+        self.index = VectorIndex(['name'])
+        for i, v in enumerate(self.y):
+            self.index.upsert(i, v, name='d%d' % i)
+
+    def test_similarities(self):
+        x = {'a': 1, 'b': 2, 'e': 1}
+        for metric in VectorIndex.metrics:
+            npt.assert_almost_equal(
+                self.index.similarities(x, metric),
+                similarty_dict(x, self.y, getattr(distance, metric)))
+
+    def test_most_similar(self):
+        x = {'a': 1, 'b': 2}
+        sims = similarty_dict(x, self.y)
+        top = self.index.most_similar(x, k=2)
+        self.assertEqual([k for k, _ in top],
+                         sorted(range(3), key=lambda i: -sims[i])[:2])
+
+    def test_mask(self):
+        self.assertEqual(
+            self.index.mask('name', ['d0', 'd2']).tolist(),
+            [True, False, True])
+
+    def test_remove(self):
+        self.index.remove(0)
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn(0, self.index)
+        self.assertEqual(self.index.attributes['name'][self.index.rows[2]],
+                         'd2')
+        for metric in VectorIndex.metrics:
+            npt.assert_almost_equal(
+                self.index.similarities({'a': 1}, metric), similarty_dict(
+                    {'a': 1}, [self.y[2], self.y[1]],
+                    getattr(distance, metric)))
+
+    def test_replace(self):
+        self.index.upsert(1, {'a': 1, 'e': 2})
+        self.index.remove(0)
+        x = {'a': 1, 'b': 2}
+        for metric in VectorIndex.metrics:
+            npt.assert_almost_equal(
+                self.index.similarities(x, metric), similarty_dict(
+                    x, [self.y[2], {'a': 1, 'e': 2}],
+                    getattr(distance, metric)))
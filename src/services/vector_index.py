@@ -0,0 +1,178 @@
+"""In memory index of sparse vectors in dict format"""
+import os
+import pickle
+from typing import Dict
+
+import numpy as np
+
+
+class VectorIndex:
+    """
+    Dense matrix of dict vectors aligned by one feature index.
+    Missing features are zero as in similarty_dict.
+    Attributes are kept row aligned to filter rows while querying.
+    Features are counted by rows having them, so features of removed
+    or replaced vectors do not change similarities.
+    """
+
+    metrics = ['correlation', 'cosine']
+
+    def __init__(self, attributes=()):
+        self.keys = list()
+        self.rows = dict()
+        self.features = dict()
+        self.row_features = dict()
+        self.feature_counts = dict()
+        self.num_features = 0
+        self.attributes = {a: list() for a in attributes}
+        self._matrix = np.zeros((16, 16))
+        self._row_stats = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_row_stats'] = None
+        return state
+
+    def __setstate__(self, state):
+        state['_row_stats'] = None
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    @property
+    def matrix(self):
+        return self._matrix[:len(self.keys), :len(self.features)]
+
+    def _grow(self, num_rows, num_features):
+        (rows, cols) = self._matrix.shape
+        if num_rows <= rows and num_features <= cols:
+            return
+        matrix = np.zeros((max(rows * 2, num_rows) if num_rows > rows
+                           else rows, max(cols * 2, num_features)
+                           if num_features > cols else cols))
+        matrix[:rows, :cols] = self._matrix
+        self._matrix = matrix
+
+    def _count_features(self, features, change):
+        for f in features:
+            count = self.feature_counts.get(f, 0) + change
+            if count == 0:
+                self.num_features -= 1
+            elif count == change:
+                self.num_features += 1
+            self.feature_counts[f] = count
+
+    def upsert(self, key, vector: Dict, **attributes):
+        """Adds or replaces vector of key"""
+        for f in vector:
+            if f not in self.features:
+                self.features[f] = len(self.features)
+        self._count_features(self.row_features.get(key, ()), -1)
+        self.row_features[key] = tuple(vector)
+        self._count_features(vector, 1)
+
+        if key not in self.rows:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            for a, values in self.attributes.items():
+                values.append(attributes.get(a))
+        else:
+            for a, v in attributes.items():
+                self.attributes[a][self.rows[key]] = v
+
+        self._grow(len(self.keys), len(self.features))
+        self._row_stats = None
+        row = self.rows[key]
+        self._matrix[row, :] = 0
+        for f, v in vector.items():
+            self._matrix[row, self.features[f]] = v
+
+    def remove(self, key):
+        """Removes vector of key by moving last row into its place"""
+        row = self.rows.pop(key)
+        self._count_features(self.row_features.pop(key), -1)
+        self._row_stats = None
+        last = len(self.keys) - 1
+        if row != last:
+            last_key = self.keys[last]
+            self._matrix[row, :] = self._matrix[last, :]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+            for values in self.attributes.values():
+                values[row] = values[last]
+        self._matrix[last, :] = 0
+        self.keys.pop()
+        for values in self.attributes.values():
+            values.pop()
+
+    def mask(self, attribute, values):
+        """Boolean mask of rows whose attribute is in values"""
+        values = set(values)
+        return np.fromiter((v in values for v in self.attributes[attribute]),
+                           dtype=bool, count=len(self.keys))
+
+    def _stats(self):
+        """Sums and sum of squares of rows which are cached until change"""
+        if self._row_stats is None:
+            matrix = self.matrix
+            self._row_stats = (matrix.sum(axis=1), (matrix**2).sum(axis=1))
+        return self._row_stats
+
+    def similarities(self, x: Dict, metric='correlation'):
+        """
+        Similarities of x to all rows as 1 - distance
+        which is equal to result of similarty_dict
+        """
+        if metric not in self.metrics:
+            raise ValueError('metric should be one of %s but not %s' %
+                             (self.metrics, metric))
+
+        matrix = self.matrix
+        aligned = np.zeros(matrix.shape[1])
+        for f, v in x.items():
+            if f in self.features:
+                aligned[self.features[f]] = v
+        values = np.array(list(x.values()), dtype=float)
+        num_features = self.num_features + \
+            len([f for f in x if not self.feature_counts.get(f)])
+
+        dots = matrix.dot(aligned)
+        (x_sum, x_sumsq) = (values.sum(), (values**2).sum())
+        (sums, sumsqs) = self._stats()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric == 'cosine':
+                return dots / np.sqrt(x_sumsq * sumsqs)
+            cov = dots - x_sum * sums / num_features
+            x_var = x_sumsq - x_sum**2 / num_features
+            variances = sumsqs - sums**2 / num_features
+            return cov / np.sqrt(x_var * variances)
+
+    def most_similar(self, x: Dict, k=5, metric='correlation', mask=None):
+        """Returns top k (key, similarity) pairs most similar to x"""
+        sims = self.similarities(x, metric)
+        candidates = np.arange(len(sims))
+        if mask is not None:
+            candidates = candidates[mask]
+        candidates = candidates[~np.isnan(sims[candidates])]
+        if len(candidates) > k:
+            top = np.argpartition(-sims[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-sims[candidates])]
+        return [(self.keys[i], float(sims[i])) for i in candidates]
+
+    def save(self, path):
+        """Writes index atomically into path"""
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
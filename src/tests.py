@@ -8,6 +8,7 @@ from classifiers.tests import *
 from services.tests import *
 from api.tests import *
 from noise.tests import *
+from visualization.tests import *
 
 if __name__ == "__main__":
     setup_logging()
@@ -1,36 +1,86 @@
 import numpy as np
 import pandas as pd
 
-from scipy.cluster.hierarchy import linkage
+from scipy.cluster.hierarchy import linkage, leaves_list
 from scipy.spatial.distance import pdist, squareform
+from sklearn.cluster import MiniBatchKMeans
 
 import plotly.plotly as py
 from plotly.graph_objs import *
-from plotly import figure_factory as ff
 from plotly.offline import download_plotlyjs, init_notebook_mode, plot, iplot
 
 
 class HeatmapVisualization:
-    def __init__(self, X, y, method='complete', metric='cosine'):
+    '''
+    Heatmap of analyses and pathways ordered by hierarchical clustering.
+    Axes with more than max_exact items are clustered approximately
+    by mini batch k-means whose centroids are clustered hierarchically.
+    If max_pathways is given, only pathways with highest variance are kept.
+    '''
+
+    def __init__(self, X, y, method='complete', metric='cosine',
+                 max_exact=1000, max_pathways=None, random_state=0):
         self.X = X
         self.y = y
-        self.linkage_func = lambda x: linkage(x, method, metric)
+        self.method = method
+        self.metric = metric
+        self.max_exact = max_exact
+        self.max_pathways = max_pathways
+        self.random_state = random_state
 
     def _map_to_data_array(self):
-        df = pd.DataFrame().from_records(self.X)
-        return df.fillna(0).values, self.y, np.array(df.keys())
+        df = pd.DataFrame().from_records(self.X).fillna(0)
+        if self.max_pathways and df.shape[1] > self.max_pathways:
+            variances = df.var().values
+            keep = np.sort(np.argsort(-variances)[:self.max_pathways])
+            df = df.iloc[:, keep]
+        return df.values, self.y, np.array(df.keys())
 
-    def clustered_data(self):
-        data_array, labels, pathways = self._map_to_data_array()
+    def _leaves(self, data):
+        '''
+        Leaf order of hierarchical clustering of rows
+        '''
+        if len(data) > self.max_exact:
+            return self._approximate_leaves(data)
+        if len(data) < 2:
+            return np.arange(len(data))
+        return leaves_list(
+            linkage(pdist(data, self.metric), self.method))
+
+    def _approximate_leaves(self, data):
+        '''
+        Orders clusters of mini batch k-means by hierarchical clustering of
+        their centroids and rows in clusters by their own clustering
+        '''
+        points = data
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(data, axis=1)
+            points = data / np.where(norms > 0, norms, 1)[:, None]
 
-        dx = ff.create_dendrogram(
-            data_array, orientation='bottom', linkagefun=self.linkage_func)
+        n_clusters = min(self.max_exact, int(np.sqrt(len(data))) * 2)
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters,
+                                 random_state=self.random_state)
+        labels = kmeans.fit_predict(points)
 
-        dy = ff.create_dendrogram(
-            data_array.T, orientation='right', linkagefun=self.linkage_func)
+        clusters = np.unique(labels)
+        centroid_leaves = self._leaves(kmeans.cluster_centers_[clusters])
+
+        leaves = list()
+        for c in clusters[centroid_leaves]:
+            members = np.where(labels == c)[0]
+            if len(members) > self.max_exact:
+                distances = np.linalg.norm(
+                    points[members] - kmeans.cluster_centers_[c], axis=1)
+                leaves.extend(members[np.argsort(distances)])
+            else:
+                leaves.extend(members[self._leaves(data[members])])
+        return np.array(leaves, dtype=int)
+
+    def clustered_data(self):
+        data_array, labels, pathways = self._map_to_data_array()
 
-        x_dendro_leaves = list(map(int, dx['layout']['xaxis']['ticktext']))
-        y_dendro_leaves = list(map(int, dy['layout']['yaxis']['ticktext']))
+        x_dendro_leaves = self._leaves(data_array)
+        y_dendro_leaves = self._leaves(data_array.T)
 
         heat_data = data_array.T
         heat_data = heat_data[y_dendro_leaves, :]
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+
+from .heatmap import HeatmapVisualization
+
+
+class HeatmapVisualizationTests(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.pathways = ['p%d' % i for i in range(5)]
+        self.data = random.rand(60, 5)
+        self.data[:, 3] *= 10
+        self.data[:, 1] *= 5
+        self.X = [dict(zip(self.pathways, row)) for row in self.data]
+        self.y = ['healthy'] * 30 + ['bc'] * 30
+
+    def assertPermutation(self, leaves, n):
+        self.assertEqual(sorted(leaves), list(range(n)))
+
+    def test_clustered_data(self):
+        heatmap = HeatmapVisualization(self.X, self.y)
+        hd = heatmap.clustered_data()
+        labels = ['%s_%d' % x for x in zip(self.y, range(len(self.y)))]
+        self.assertEqual(sorted(hd['x']), sorted(labels))
+        self.assertEqual(sorted(hd['y']), self.pathways)
+        self.assertEqual(np.array(hd['z']).shape, (5, 60))
+
+        row = labels.index(hd['x'][0])
+        column = self.pathways.index(hd['y'][0])
+        self.assertEqual(hd['z'][0][0], self.data[row, column])
+
+    def test_clustered_data_single_analysis(self):
+        heatmap = HeatmapVisualization(self.X[:1], self.y[:1])
+        hd = heatmap.clustered_data()
+        self.assertEqual(hd['x'], ['healthy_0'])
+        self.assertEqual(np.array(hd['z']).shape, (5, 1))
+
+    def test_approximate_leaves(self):
+        heatmap = HeatmapVisualization(self.X, self.y, max_exact=10)
+        self.assertPermutation(heatmap._leaves(self.data), 60)
+
+    def test_approximate_leaves_large_clusters(self):
+        heatmap = HeatmapVisualization(self.X, self.y, max_exact=3)
+        self.assertPermutation(heatmap._leaves(self.data), 60)
+
+    def test_approximate_clustered_data(self):
+        heatmap = HeatmapVisualization(self.X, self.y, max_exact=10)
+        hd = heatmap.clustered_data()
+        self.assertEqual(len(set(hd['x'])), 60)
+        self.assertEqual(np.array(hd['z']).shape, (5, 60))
+
+    def test_max_pathways(self):
+        heatmap = HeatmapVisualization(self.X, self.y, max_pathways=2)
+        hd = heatmap.clustered_data()
+        self.assertEqual(sorted(hd['y']), ['p1', 'p3'])
+        self.assertEqual(np.array(hd['z']).shape, (2, 60))